@@ -16,9 +16,37 @@ app.autodiscover_tasks()
 
 # Celery Beat schedule for periodic tasks
 app.conf.beat_schedule = {
-    'check-birthdays-daily': {
+    'dispatch-due-wishes': {
+        'task': 'wishes.tasks.dispatch_due_wishes',
+        'schedule': 10.0,  # Every 10 seconds
+    },
+    'drain-outbox': {
+        'task': 'wishes.tasks.drain_outbox',
+        'schedule': 10.0,  # Every 10 seconds
+    },
+    'check-birthdays-hourly': {
         'task': 'wishes.tasks.check_birthdays_today',
-        'schedule': crontab(hour=0, minute=0),  # Run at midnight daily
+        'schedule': crontab(minute=0),  # Hourly, one slot per UTC-offset bucket
+    },
+    'refresh-timezone-buckets': {
+        'task': 'wishes.tasks.refresh_timezone_buckets',
+        'schedule': crontab(hour=1, minute=30),  # Daily, picks up DST changes
+    },
+    'refresh-upcoming-birthdays': {
+        'task': 'wishes.tasks.refresh_upcoming_birthdays',
+        'schedule': crontab(hour=0, minute=5),  # Nightly roll-forward
+    },
+    'resync-site-stats': {
+        'task': 'wishes.tasks.resync_site_stats',
+        'schedule': crontab(hour=3, minute=15),  # Nightly reconciliation
+    },
+    'flush-wish-counters': {
+        'task': 'wishes.tasks.flush_wish_counters',
+        'schedule': crontab(),  # Every minute
+    },
+    'flush-template-usage': {
+        'task': 'wishes.tasks.flush_template_usage',
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes
     },
     'send-birthday-reminders': {
         'task': 'wishes.tasks.send_birthday_reminders',
@@ -38,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'wishes.middleware.WishStatsLoaderMiddleware',
 ]
 
 ROOT_URLCONF = 'birthday_system.urls'
@@ -99,6 +100,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "tailwind"
 CRISPY_TEMPLATE_PACK = "tailwind"
 
+# Cache: counter buffers, version stamps and rate-limit buckets must be seen by
+# the web processes and every Celery worker, so it has to be shared (Redis).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('CACHE_LOCATION', default='redis://localhost:6379/1'),
+    }
+}
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -107,6 +117,33 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Base URL used in notification emails
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
+
+# Messages sent per SMTP connection before it is reopened
+EMAIL_BATCH_SIZE = config('EMAIL_BATCH_SIZE', default=100, cast=int)
+
+# Notification outbox: entries per drain batch, delivery attempts before a
+# notification is given up on, and the first retry delay in seconds (doubles per attempt)
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=100, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=6, cast=int)
+OUTBOX_RETRY_DELAY = config('OUTBOX_RETRY_DELAY', default=60, cast=int)
+
+# Outbound notification rate limits, as token buckets shared through the cache:
+# 'rate' tokens per second refill up to 'burst'. 'total' caps the channel as a
+# whole, 'domains' each recipient domain ('*' for domains without an entry).
+NOTIFICATION_RATE_LIMITS = {
+    'email': {
+        'total': {'rate': 20, 'burst': 200},
+        'domains': {
+            '*': {'rate': 5, 'burst': 50},
+        },
+    },
+}
+
+# Scheduled wishes claimed per dispatcher batch
+WISH_DISPATCH_BATCH_SIZE = config('WISH_DISPATCH_BATCH_SIZE', default=200, cast=int)
+
 # Channels Configuration
 CHANNEL_LAYERS = {
     'default': {
@@ -129,9 +166,37 @@ GOOGLE_CALENDAR_CREDENTIALS = config('GOOGLE_CALENDAR_CREDENTIALS', default='')
 from celery.schedules import crontab
 
 CELERY_BEAT_SCHEDULE = {
-    'check-birthdays-daily': {
+    'dispatch-due-wishes': {
+        'task': 'wishes.tasks.dispatch_due_wishes',
+        'schedule': 10.0,  # Every 10 seconds
+    },
+    'drain-outbox': {
+        'task': 'wishes.tasks.drain_outbox',
+        'schedule': 10.0,  # Every 10 seconds
+    },
+    'check-birthdays-hourly': {
         'task': 'wishes.tasks.check_birthdays_today',
-        'schedule': crontab(hour=0, minute=0),  # Run at midnight
+        'schedule': crontab(minute=0),  # Run hourly, one slot per UTC-offset bucket
+    },
+    'refresh-timezone-buckets': {
+        'task': 'wishes.tasks.refresh_timezone_buckets',
+        'schedule': crontab(hour=1, minute=30),  # Run daily to pick up DST changes
+    },
+    'refresh-upcoming-birthdays': {
+        'task': 'wishes.tasks.refresh_upcoming_birthdays',
+        'schedule': crontab(hour=0, minute=5),  # Run nightly to roll the table forward
+    },
+    'resync-site-stats': {
+        'task': 'wishes.tasks.resync_site_stats',
+        'schedule': crontab(hour=3, minute=15),  # Nightly reconciliation
+    },
+    'flush-wish-counters': {
+        'task': 'wishes.tasks.flush_wish_counters',
+        'schedule': crontab(),  # Every minute
+    },
+    'flush-template-usage': {
+        'task': 'wishes.tasks.flush_template_usage',
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes
     },
     'send-birthday-reminders': {
         'task': 'wishes.tasks.send_birthday_reminders',
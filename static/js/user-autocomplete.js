@@ -0,0 +1,79 @@
+// Recipient pickers: search users by name and submit only the chosen id
+(function() {
+    if (window.userAutocompleteLoaded) {
+        return;
+    }
+    window.userAutocompleteLoaded = true;
+
+    function initializeUserAutocomplete(container) {
+        const input = container.querySelector('[data-autocomplete-input]');
+        const value = container.querySelector('[data-autocomplete-value]');
+        const results = container.querySelector('[data-autocomplete-results]');
+        let timer = null;
+        let controller = null;
+
+        function close() {
+            results.classList.add('hidden');
+            results.innerHTML = '';
+        }
+
+        function choose(user) {
+            value.value = user.id;
+            input.value = user.name ? `${user.name} (${user.username})` : user.username;
+            close();
+        }
+
+        function search() {
+            const query = input.value.trim();
+            if (!query) {
+                close();
+                return;
+            }
+
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+
+            fetch(`${container.dataset.url}?q=${encodeURIComponent(query)}`, { signal: controller.signal })
+                .then(response => response.json())
+                .then(data => {
+                    results.innerHTML = '';
+                    data.results.forEach(user => {
+                        const item = document.createElement('li');
+                        item.className = 'px-4 py-2 cursor-pointer hover:bg-purple-50';
+                        item.textContent = user.name ? `${user.name} (${user.username})` : user.username;
+                        item.addEventListener('mousedown', event => {
+                            event.preventDefault();
+                            choose(user);
+                        });
+                        results.appendChild(item);
+                    });
+                    results.classList.toggle('hidden', data.results.length === 0);
+                })
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error('Autocomplete error:', error);
+                    }
+                });
+        }
+
+        input.addEventListener('input', function() {
+            // Typing invalidates the previous choice until a new one is picked
+            value.value = '';
+            clearTimeout(timer);
+            timer = setTimeout(search, 150);
+        });
+        input.addEventListener('blur', close);
+    }
+
+    function initializeAll() {
+        document.querySelectorAll('[data-user-autocomplete]').forEach(initializeUserAutocomplete);
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', initializeAll);
+    } else {
+        initializeAll();
+    }
+})();
@@ -1,13 +1,33 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.html import format_html
+from django.utils import timezone
 from django.urls import reverse
 from django.db.models import Count, Q
+from .birthdays import attach_birthday_facts
+from .counters import wish_counters, wish_viewers
 from .models import (
-    UserProfile, BirthdayWish, GroupWish, GroupWishContribution,
-    GiftSuggestion, CalendarEvent, ChatMessage, WishTemplate
+    UserProfile, Contact, BirthdayWish, GroupWish, GroupWishContribution,
+    GiftSuggestion, CalendarEvent, ChatMessage, Outbox, WishTemplate
 )
 
 
+class UserProfileChangeList(ChangeList):
+    """Change list that computes ages for the whole page at once"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = attach_birthday_facts(self.result_list)
+
+
+class BirthdayWishChangeList(ChangeList):
+    """Change list that reads unflushed view and like counts for the whole page at once"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = wish_counters.attach_pending(self.result_list)
+
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     """Custom admin for user profiles"""
@@ -33,21 +53,35 @@ class UserProfileAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_changelist(self, request, **kwargs):
+        return UserProfileChangeList
+
     def get_age(self, obj):
         age = obj.get_age()
-        return age if age else 'N/A'
+        return age if age is not None else 'N/A'
 
     get_age.short_description = 'Age'
 
 
+@admin.register(Contact)
+class ContactAdmin(admin.ModelAdmin):
+    """Custom admin for contacts"""
+    list_display = ['owner', 'contact', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['owner__username', 'contact__username']
+    raw_id_fields = ['owner', 'contact']
+    readonly_fields = ['created_at']
+
+
 @admin.register(BirthdayWish)
 class BirthdayWishAdmin(admin.ModelAdmin):
     """Custom admin for birthday wishes"""
     list_display = ['id_display', 'sender', 'recipient', 'wish_type', 'status',
-                    'scheduled_date', 'is_public', 'views_count', 'likes_count']
+                    'scheduled_date', 'is_public', 'get_views_count', 'get_likes_count']
     list_filter = ['wish_type', 'status', 'is_public', 'created_at']
     search_fields = ['sender__username', 'recipient__username', 'text_content']
-    readonly_fields = ['id', 'created_at', 'updated_at', 'sent_date', 'views_count', 'likes_count']
+    readonly_fields = ['id', 'created_at', 'updated_at', 'sent_date', 'get_views_count', 'get_likes_count',
+                       'get_unique_viewers']
     date_hierarchy = 'created_at'
 
     fieldsets = (
@@ -64,7 +98,7 @@ class BirthdayWishAdmin(admin.ModelAdmin):
             'fields': ('is_public', 'is_anonymous')
         }),
         ('Engagement', {
-            'fields': ('likes_count', 'views_count'),
+            'fields': ('get_likes_count', 'get_views_count', 'get_unique_viewers'),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -73,26 +107,54 @@ class BirthdayWishAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_changelist(self, request, **kwargs):
+        return BirthdayWishChangeList
+
     def id_display(self, obj):
         return str(obj.id)[:8]
 
     id_display.short_description = 'ID'
 
+    def get_views_count(self, obj):
+        return wish_counters.current(obj, 'views_count')
+
+    get_views_count.short_description = 'Views'
+
+    def get_likes_count(self, obj):
+        return wish_counters.current(obj, 'likes_count')
+
+    get_likes_count.short_description = 'Likes'
+
+    def get_unique_viewers(self, obj):
+        return f'~{wish_viewers.estimate(obj)}'
+
+    get_unique_viewers.short_description = 'Unique viewers (estimate)'
+
     actions = ['mark_as_sent', 'mark_as_scheduled']
 
     def mark_as_sent(self, request, queryset):
-        updated = queryset.update(status='sent')
-        self.message_user(request, f'{updated} wishes marked as sent.')
+        # Compare-and-set: rows a worker sends meanwhile are neither counted nor touched again
+        updated = queryset.transition('sent', sent_date=timezone.now())
+        self.message_user(request, f'{len(updated)} wishes marked as sent.')
 
     mark_as_sent.short_description = 'Mark selected wishes as sent'
 
     def mark_as_scheduled(self, request, queryset):
-        updated = queryset.update(status='scheduled')
-        self.message_user(request, f'{updated} wishes marked as scheduled.')
+        updated = queryset.transition('scheduled')
+        self.message_user(request, f'{len(updated)} wishes marked as scheduled.')
 
     mark_as_scheduled.short_description = 'Mark selected wishes as scheduled'
 
 
+@admin.register(Outbox)
+class OutboxAdmin(admin.ModelAdmin):
+    """Custom admin for queued wish notifications"""
+    list_display = ['wish', 'attempts', 'next_attempt_at', 'failed_at', 'created_at']
+    list_filter = ['attempts', ('failed_at', admin.EmptyFieldListFilter)]
+    raw_id_fields = ['wish']
+    readonly_fields = ['created_at']
+
+
 @admin.register(GroupWish)
 class GroupWishAdmin(admin.ModelAdmin):
     """Custom admin for group wishes"""
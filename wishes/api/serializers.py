@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from wishes.models import (
     UserProfile, BirthdayWish, GroupWish,
-    GiftSuggestion, CalendarEvent
+    GiftSuggestion, CalendarEvent, Contact
 )
+from wishes.birthdays import attach_birthday_facts
+from wishes.counters import wish_counters
 from django.contrib.auth.models import User
 
 
@@ -15,6 +17,15 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class UserProfileListSerializer(serializers.ListSerializer):
+    """Computes birthday facts for the whole page in a single pass"""
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        return super().to_representation(attach_birthday_facts(data))
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """Serializer for UserProfile model"""
     user = UserSerializer(read_only=True)
@@ -23,19 +34,51 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserProfile
+        list_serializer_class = UserProfileListSerializer
         fields = ['id', 'user', 'birthday', 'profile_picture',
                   'phone_number', 'bio', 'age', 'next_birthday',
                   'timezone', 'created_at']
         read_only_fields = ['id', 'created_at']
 
 
+class ContactSerializer(serializers.ModelSerializer):
+    """Serializer for Contact model"""
+    contact_name = serializers.CharField(source='contact.username', read_only=True)
+
+    class Meta:
+        model = Contact
+        fields = ['id', 'contact', 'contact_name', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+    def validate_contact(self, value):
+        """Users cannot follow themselves or the same contact twice"""
+        owner = self.context['request'].user
+        if value == owner:
+            raise serializers.ValidationError('You cannot add yourself as a contact')
+        if Contact.objects.filter(owner=owner, contact=value).exists():
+            raise serializers.ValidationError('Already in your contacts')
+        return value
+
+
+class BirthdayWishListSerializer(serializers.ListSerializer):
+    """Reads the unflushed view and like counts for the whole page at once"""
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        return super().to_representation(wish_counters.attach_pending(data))
+
+
 class BirthdayWishSerializer(serializers.ModelSerializer):
     """Serializer for BirthdayWish model"""
     sender_name = serializers.CharField(source='sender.username', read_only=True)
     recipient_name = serializers.CharField(source='recipient.username', read_only=True)
+    likes_count = serializers.SerializerMethodField()
+    views_count = serializers.SerializerMethodField()
 
     class Meta:
         model = BirthdayWish
+        list_serializer_class = BirthdayWishListSerializer
         fields = ['id', 'sender', 'sender_name', 'recipient',
                   'recipient_name', 'wish_type', 'text_content',
                   'voice_message', 'status', 'scheduled_date',
@@ -44,6 +87,23 @@ class BirthdayWishSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'sender', 'likes_count',
                             'views_count', 'created_at']
 
+    def to_representation(self, instance):
+        """Hide who sent an anonymous wish from everyone but the sender"""
+        data = super().to_representation(instance)
+        request = self.context.get('request')
+        if instance.is_anonymous and (request is None or request.user.pk != instance.sender_id):
+            data['sender'] = None
+            data['sender_name'] = ''
+        return data
+
+    def get_likes_count(self, obj):
+        """Stored likes plus those not yet flushed"""
+        return wish_counters.current(obj, 'likes_count')
+
+    def get_views_count(self, obj):
+        """Stored views plus those not yet flushed"""
+        return wish_counters.current(obj, 'views_count')
+
 
 class GiftSuggestionSerializer(serializers.ModelSerializer):
     """Serializer for GiftSuggestion model"""
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     UserProfileViewSet, BirthdayWishViewSet,
-    GiftSuggestionViewSet, GroupWishViewSet
+    GiftSuggestionViewSet, GroupWishViewSet, ContactViewSet
 )
 
 router = DefaultRouter()
@@ -10,6 +10,7 @@ router.register(r'profiles', UserProfileViewSet)
 router.register(r'wishes', BirthdayWishViewSet)
 router.register(r'gifts', GiftSuggestionViewSet)
 router.register(r'group-wishes', GroupWishViewSet)
+router.register(r'contacts', ContactViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
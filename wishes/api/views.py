@@ -1,15 +1,17 @@
-from rest_framework import viewsets, status, filters
+from rest_framework import viewsets, status, filters, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import models
 
+from wishes.counters import wish_counters, wish_viewers
 from wishes.models import (
-    UserProfile, BirthdayWish, GroupWish, GiftSuggestion
+    UserProfile, BirthdayWish, GroupWish, GiftSuggestion, Contact, WishLike
 )
 from .serializers import (
     UserProfileSerializer, BirthdayWishSerializer,
-    GroupWishSerializer, GiftSuggestionSerializer
+    GroupWishSerializer, GiftSuggestionSerializer, ContactSerializer
 )
 
 
@@ -26,9 +28,9 @@ class UserProfileViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def upcoming_birthdays(self, request):
-        """Get upcoming birthdays"""
+        """Get upcoming birthdays of the current user's contacts"""
         days = int(request.query_params.get('days', 30))
-        profiles = UserProfile.objects.get_upcoming_birthdays(days=days)
+        profiles = UserProfile.objects.get_upcoming_birthdays_for(request.user, days=days)
         serializer = self.get_serializer(profiles, many=True)
         return Response(serializer.data)
 
@@ -40,6 +42,24 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+class ContactViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
+                     viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for the current user's contacts
+    """
+    queryset = Contact.objects.all()
+    serializer_class = ContactSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Only the current user's contacts"""
+        return Contact.objects.filter(owner=self.request.user).select_related('contact')
+
+    def perform_create(self, serializer):
+        """Set owner to current user"""
+        serializer.save(owner=self.request.user)
+
+
 class BirthdayWishViewSet(viewsets.ModelViewSet):
     """
     API endpoint for birthday wishes
@@ -52,16 +72,36 @@ class BirthdayWishViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'scheduled_date']
 
     def get_queryset(self):
-        """Filter wishes based on user"""
+        """Filter wishes based on user; public wishes can also be viewed and liked"""
         user = self.request.user
-        return BirthdayWish.objects.filter(
-            models.Q(sender=user) | models.Q(recipient=user)
-        )
+        visible = models.Q(sender=user) | models.Q(recipient=user)
+        if self.action in ('retrieve', 'like'):
+            visible |= models.Q(is_public=True, status='sent')
+        return BirthdayWish.objects.filter(visible)
 
     def perform_create(self, serializer):
         """Set sender to current user"""
         serializer.save(sender=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        """Get a wish, counting the view in the write-behind buffer"""
+        wish = self.get_object()
+        if request.user != wish.sender:
+            wish_counters.add(wish.pk, 'views_count')
+            if wish.is_public:
+                wish_viewers.add(wish.pk, request.user.pk)
+        serializer = self.get_serializer(wish)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def like(self, request, pk=None):
+        """Like a wish, once per user"""
+        wish = self.get_object()
+        _, created = WishLike.objects.get_or_create(wish=wish, user=request.user)
+        if created:
+            wish_counters.add(wish.pk, 'likes_count')
+        return Response({'liked': created, 'likes_count': wish_counters.current(wish, 'likes_count')})
+
     @action(detail=False, methods=['get'])
     def sent(self, request):
         """Get wishes sent by current user"""
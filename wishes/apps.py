@@ -7,5 +7,6 @@ class WishesConfig(AppConfig):
     verbose_name = 'Birthday Wishes'
 
     def ready(self):
-        """Import signal handlers when the app is ready"""
+        """Import signal handlers and system checks when the app is ready"""
+        import wishes.checks  # noqa
         import wishes.signals  # noqa
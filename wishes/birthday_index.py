@@ -0,0 +1,111 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .birthdays import ordinal_ranges
+
+VERSION_KEY = 'birthday_index_version'
+
+_index = None
+_lock = threading.Lock()
+
+
+class BirthdayIndex:
+    """
+    Sorted (MMDD ordinal, profile id) pairs for every profile with a birthday.
+
+    Lookups are binary-search slices over two parallel arrays, so answering
+    "upcoming", "today" or "this month" never touches the database.
+    """
+
+    __slots__ = ('version', 'ordinals', 'profile_ids')
+
+    def __init__(self, version, pairs):
+        self.version = version
+        self.ordinals = array('H')
+        self.profile_ids = array('q')
+        for ordinal, profile_id in pairs:
+            self.ordinals.append(ordinal)
+            self.profile_ids.append(profile_id)
+
+    @classmethod
+    def build(cls, version):
+        """Load the index from the database, sorted by ordinal"""
+        from .models import UserProfile
+
+        pairs = UserProfile.objects.exclude(birthday_ordinal__isnull=True).order_by(
+            'birthday_ordinal', 'pk'
+        ).values_list('birthday_ordinal', 'pk')
+        return cls(version, pairs.iterator())
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def between(self, low, high):
+        """Profile ids whose ordinal falls within [low, high]"""
+        start = bisect_left(self.ordinals, low)
+        end = bisect_right(self.ordinals, high)
+        return self.profile_ids[start:end].tolist()
+
+    def upcoming(self, days=30, today=None):
+        """Profile ids with a birthday in the next 'days' days, soonest first"""
+        today = today or timezone.now().date()
+        ids = []
+        for low, high in ordinal_ranges(today, days):
+            ids.extend(self.between(low, high))
+        return ids
+
+    def today(self, today=None):
+        """Profile ids with a birthday today"""
+        return self.upcoming(days=0, today=today)
+
+    def this_month(self, today=None):
+        """Profile ids with a birthday in the current month"""
+        today = today or timezone.now().date()
+        return self.between(today.month * 100 + 1, today.month * 100 + 31)
+
+
+def current_version():
+    """Return the shared index version, creating it if missing"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed with a timestamp so a flushed cache never hands out a
+        # version number that a stale process already holds.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Invalidate the index in every process"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+def get_birthday_index():
+    """Return this process's index, rebuilding it if the version moved"""
+    global _index
+
+    version = current_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = BirthdayIndex.build(version)
+        return _index
+
+
+def profiles_for(profile_ids):
+    """Fetch profiles (with users) for the given ids, preserving order"""
+    from .models import UserProfile
+
+    profiles = UserProfile.objects.select_related('user').in_bulk(profile_ids)
+    return [profiles[pk] for pk in profile_ids if pk in profiles]
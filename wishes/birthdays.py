@@ -0,0 +1,137 @@
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
+
+BirthdayFacts = namedtuple('BirthdayFacts', ['next_birthday', 'days_until', 'age'])
+
+# Whole-hour UTC offsets span UTC-12 (Baker Island) to UTC+14 (Kiribati)
+MIN_OFFSET_BUCKET = -12
+MAX_OFFSET_BUCKET = 14
+
+
+def birthday_ordinal(birthday):
+    """Encode a birthday as an MMDD integer (e.g. March 15 -> 315)"""
+    if not birthday:
+        return None
+    return birthday.month * 100 + birthday.day
+
+
+def ordinal_ranges(start, days):
+    """
+    Split the window [start, start + days] into inclusive MMDD ranges.
+
+    A window that crosses New Year is returned as two ranges, the
+    December part first. Feb 29 birthdays are celebrated on Feb 28 in
+    non-leap years, so a range ending on Feb 28 of a non-leap year is
+    stretched to cover 229. A window of a year or more covers every day,
+    split at 'start' so the ranges still run soonest first.
+    """
+    if days >= 365:
+        low = birthday_ordinal(start)
+        return [(low, 1231), (101, low - 1)] if low > 101 else [(101, 1231)]
+
+    end = start + timedelta(days=days)
+    if start.year == end.year:
+        segments = [(start, end)]
+    else:
+        segments = [(start, start.replace(month=12, day=31)),
+                    (end.replace(month=1, day=1), end)]
+
+    ranges = []
+    for first, last in segments:
+        low, high = birthday_ordinal(first), birthday_ordinal(last)
+        if high == 228 and not calendar.isleap(last.year):
+            high = 229
+        ranges.append((low, high))
+
+    return ranges
+
+
+def years_before(day, years):
+    """
+    Shift a date back by whole years.
+
+    The result is the latest birthday that has already come round 'years'
+    times by 'day', so Feb 29 maps to Feb 28 and, on Feb 28 of a non-leap
+    year, to Feb 29 of a leap target year.
+    """
+    target = day.year - years
+    if (day.month, day.day) == (2, 28) and not calendar.isleap(day.year) and calendar.isleap(target):
+        return date(target, 2, 29)
+    try:
+        return day.replace(year=target)
+    except ValueError:
+        return day.replace(year=target, day=28)
+
+
+def birthday_facts(birthdays, today=None):
+    """
+    Compute next birthday, days until it and current age for many birthdays.
+
+    'today' is read once for the whole batch and every row is handled with
+    integer ordinal arithmetic. Feb 29 birthdays fall on Feb 28 in non-leap
+    years. Missing birthdays yield None.
+    """
+    today = today or timezone.now().date()
+    today_ordinal = birthday_ordinal(today)
+    today_number = today.toordinal()
+    leap_years = {}
+
+    def is_leap(year):
+        if year not in leap_years:
+            leap_years[year] = calendar.isleap(year)
+        return leap_years[year]
+
+    facts = []
+    for birthday in birthdays:
+        if not birthday:
+            facts.append(None)
+            continue
+
+        ordinal = birthday.month * 100 + birthday.day
+        observed = 228 if ordinal == 229 and not is_leap(today.year) else ordinal
+
+        year = today.year if observed >= today_ordinal else today.year + 1
+        if ordinal == 229 and not is_leap(year):
+            next_birthday = date(year, 2, 28)
+        else:
+            next_birthday = date(year, birthday.month, birthday.day)
+
+        age = today.year - birthday.year - (today_ordinal < observed)
+        facts.append(BirthdayFacts(next_birthday, next_birthday.toordinal() - today_number, age))
+
+    return facts
+
+
+def attach_birthday_facts(profiles, today=None):
+    """Compute birthday facts for a list of profiles in one pass and cache them on each"""
+    profiles = list(profiles)
+    for profile, facts in zip(profiles, birthday_facts([p.birthday for p in profiles], today)):
+        profile._birthday_facts = facts
+    return profiles
+
+
+def utc_offset_bucket(tz_name, at=None):
+    """
+    Whole-hour UTC offset of a time zone, rounded down.
+
+    Rounding down means a run at the top of UTC hour H sees every zone in
+    the bucket between 00:00 and 01:00 local time, including half-hour zones.
+    Unknown zone names fall back to UTC.
+    """
+    try:
+        zone = ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return 0
+
+    at = at or timezone.now()
+    return int(at.astimezone(zone).utcoffset().total_seconds() // 3600)
+
+
+def midnight_buckets(utc_hour):
+    """Offset buckets whose local day starts during the given UTC hour"""
+    candidates = (-utc_hour, 24 - utc_hour)
+    return [b for b in candidates if MIN_OFFSET_BUCKET <= b <= MAX_OFFSET_BUCKET]
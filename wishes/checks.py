@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Caches whose state never leaves the process that wrote it
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_rate_limit_cache(app_configs, **kwargs):
+    """Rate-limit buckets only limit anything if every worker shares them"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', PER_PROCESS_CACHES[0])
+    if getattr(settings, 'NOTIFICATION_RATE_LIMITS', None) and backend in PER_PROCESS_CACHES:
+        return [Error(
+            f'NOTIFICATION_RATE_LIMITS is set but the default cache is {backend.rsplit(".", 1)[1]}.',
+            hint='Each process would get its own token buckets, multiplying every limit by the '
+                 'number of workers. Configure a shared cache such as RedisCache.',
+            id='wishes.E001',
+        )]
+    return []
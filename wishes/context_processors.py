@@ -1,19 +1,66 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from .birthday_index import get_birthday_index, profiles_for
+from .ics import get_feed_version
 from .models import UserProfile
 
+SUMMARY_KEY = 'birthday_context:{user_id}:{version}'
+
+
+def _local_zone(tz_name):
+    try:
+        return ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('UTC')
+
+
+def _birthday_summary(user):
+    """
+    Upcoming and today's birthdays among the user's contacts.
+
+    Cached until the user's local midnight. The key carries the user's
+    contacts version, so following someone or a followed birthday changing
+    starts a fresh entry.
+    """
+    version, _ = get_feed_version(user.pk)
+    key = SUMMARY_KEY.format(user_id=user.pk, version=version)
+
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+    now = timezone.now().astimezone(_local_zone(profile.timezone))
+    local_today = now.date()
+    midnight = datetime.combine(local_today + timedelta(days=1), time.min, tzinfo=now.tzinfo)
+
+    index = get_birthday_index()
+    contact_ids = UserProfile.objects.get_contact_profile_ids(user)
+    summary = {
+        'upcoming_count': sum(1 for pk in index.upcoming(days=7, today=local_today) if pk in contact_ids),
+        'today_ids': [pk for pk in index.today(today=local_today) if pk in contact_ids],
+    }
+
+    cache.set(key, summary, max(int((midnight - now).total_seconds()), 1))
+    return summary
+
 
 def birthday_context(request):
-    """Add birthday-related context to all templates"""
+    """Add birthday-related context to all templates, computed only when used"""
     context = {}
 
     if request.user.is_authenticated:
+        summary = SimpleLazyObject(lambda: _birthday_summary(request.user))
+
         # Get upcoming birthdays count
-        upcoming = UserProfile.objects.get_upcoming_birthdays(days=7)
-        context['upcoming_birthdays_count'] = len(upcoming)
+        context['upcoming_birthdays_count'] = SimpleLazyObject(lambda: summary['upcoming_count'])
 
         # Get today's birthdays
-        today_birthdays = UserProfile.objects.get_today_birthdays()
-        context['today_birthdays'] = today_birthdays
-        context['today_birthdays_count'] = today_birthdays.count()
+        context['today_birthdays'] = SimpleLazyObject(lambda: profiles_for(summary['today_ids']))
+        context['today_birthdays_count'] = SimpleLazyObject(lambda: len(summary['today_ids']))
 
-    return context
\ No newline at end of file
+    return context
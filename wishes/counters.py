@@ -0,0 +1,285 @@
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .hll import HyperLogLog
+
+
+class DirtyList:
+    """
+    Shared list of objects with buffered changes waiting to be flushed.
+
+    Each object is listed once in a numbered cache slot until a flush
+    drains it, so listing costs a cache.add on every event after the first.
+    Markers expire after 'marker_timeout' seconds, so an object whose slot
+    was lost is listed again by its next event.
+    """
+
+    def __init__(self, prefix, marker_timeout=60 * 60):
+        self.prefix = prefix
+        self.marker_timeout = marker_timeout
+
+    def _marker_key(self, pk):
+        return f'{self.prefix}:dirty:{pk}'
+
+    def _slot_key(self, seq):
+        return f'{self.prefix}:slot:{seq}'
+
+    def mark(self, pk):
+        """List an object for the next flush unless it is already listed"""
+        if cache.add(self._marker_key(pk), 1, self.marker_timeout):
+            seq = incr(f'{self.prefix}:seq', 1)
+            cache.set(self._slot_key(seq), pk, None)
+
+    def unmark(self, pks):
+        """Unlist objects, so events arriving from here on list them again"""
+        cache.delete_many([self._marker_key(pk) for pk in pks])
+
+    def drain(self):
+        """Take every listed primary key, or None if another flush is running"""
+        lock = f'{self.prefix}:flush-lock'
+        if not cache.add(lock, 1, 300):
+            return None
+
+        try:
+            start = cache.get(f'{self.prefix}:flushed', 0)
+            end = cache.get(f'{self.prefix}:seq', 0)
+            if end <= start:
+                return []
+
+            seqs = range(start + 1, end + 1)
+            slots = cache.get_many([self._slot_key(seq) for seq in seqs])
+
+            # A slot number is taken a moment before its slot is written, so stop
+            # short of an empty slot and read it next time. One still empty on the
+            # next flush belongs to a writer that died; its marker expires instead.
+            gap_key = f'{self.prefix}:gap'
+            stalled = cache.get(gap_key)
+            stop = end
+            for seq in seqs:
+                if self._slot_key(seq) not in slots and seq != stalled:
+                    stop = seq - 1
+                    break
+
+            taken = [self._slot_key(seq) for seq in range(start + 1, stop + 1)]
+            cache.delete_many(taken)
+            cache.set(f'{self.prefix}:flushed', stop, None)
+            if stop < end:
+                cache.set(gap_key, stop + 1, None)
+            else:
+                cache.delete(gap_key)
+            return list({slots[key] for key in taken if key in slots})
+        finally:
+            cache.delete(lock)
+
+
+def incr(key, delta, timeout=None):
+    """
+    cache.incr that creates the key when it is missing.
+
+    With a timeout, the key expires that long after it was created or last
+    went up from 0, i.e. after the first event following a flush.
+    """
+    try:
+        value = cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout):
+            return delta
+        value = cache.incr(key, delta)
+    if timeout is not None and value == delta:
+        cache.touch(key, timeout)
+    return value
+
+
+class CounterBuffer:
+    """
+    Write-behind buffer for integer counter columns of one model.
+
+    Events are counted with cache.incr, so a page view never writes the row.
+    flush() turns the accumulated deltas into UPDATE ... SET field = field + n
+    statements, one per (field, n) group. Delta keys flushed back to 0 expire
+    after 'timeout' seconds without events rather than living forever.
+    """
+
+    def __init__(self, model_label, fields, prefix, timeout=60 * 60 * 24):
+        self.model_label = model_label
+        self.fields = tuple(fields)
+        self.prefix = prefix
+        self.timeout = timeout
+        self.dirty = DirtyList(prefix)
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def _delta_key(self, field, pk):
+        return f'{self.prefix}:{field}:{pk}'
+
+    def add(self, pk, field, delta=1):
+        """Count 'delta' events on an object's counter"""
+        if field not in self.fields:
+            raise ValueError(f'{field} is not a buffered counter')
+        pk = str(pk)
+        incr(self._delta_key(field, pk), delta, self.timeout)
+        self.dirty.mark(pk)
+
+    def pending(self, pks):
+        """Unflushed deltas as {pk: {field: n}} for the given primary keys"""
+        keys = {
+            self._delta_key(field, str(pk)): (pk, field)
+            for pk in pks for field in self.fields
+        }
+        found = cache.get_many(keys)
+        result = defaultdict(dict)
+        for key, (pk, field) in keys.items():
+            result[pk][field] = found.get(key, 0)
+        return result
+
+    def attach_pending(self, instances):
+        """Store unflushed deltas on each instance with one cache round trip"""
+        instances = list(instances)
+        pending = self.pending([instance.pk for instance in instances])
+        for instance in instances:
+            instance._pending_counts = pending[instance.pk]
+        return instances
+
+    def current(self, instance, field):
+        """Stored value plus anything still waiting in the buffer"""
+        pending = getattr(instance, '_pending_counts', None)
+        if pending is None:
+            pending = self.pending([instance.pk])[instance.pk]
+        return getattr(instance, field) + pending.get(field, 0)
+
+    def flush(self, chunk_size=500):
+        """Apply buffered deltas to the database and return the number of rows touched"""
+        pks = self.dirty.drain() or []
+
+        touched = 0
+        for offset in range(0, len(pks), chunk_size):
+            touched += self._flush_chunk(pks[offset:offset + chunk_size])
+        return touched
+
+    def _flush_chunk(self, pks):
+        self.dirty.unmark(pks)
+
+        groups = defaultdict(list)
+        taken = {}
+        for pk, counts in self.pending(pks).items():
+            for field, delta in counts.items():
+                if delta:
+                    groups[field, delta].append(pk)
+                    taken[self._delta_key(field, pk)] = delta
+        for key, delta in taken.items():
+            cache.decr(key, delta)
+
+        try:
+            with transaction.atomic():
+                for (field, delta), group in groups.items():
+                    self.model._base_manager.filter(pk__in=group).update(**{field: F(field) + delta})
+        except Exception:
+            # Hand the deltas back so the next flush retries them
+            for key, delta in taken.items():
+                incr(key, delta, self.timeout)
+            for pk in pks:
+                self.dirty.mark(pk)
+            raise
+
+        return len({pk for group in groups.values() for pk in group})
+
+
+class SketchBuffer:
+    """
+    Write-behind HyperLogLog sketches stored in a binary column of one model.
+
+    New items go into a cached sketch per object under a short cache lock;
+    flush() merges it into the stored sketch. Merging is idempotent, so the
+    cached sketch is kept until it expires rather than cleared on flush.
+    """
+
+    def __init__(self, model_label, field, prefix, timeout=60 * 60 * 24):
+        self.model_label = model_label
+        self.field = field
+        self.prefix = prefix
+        self.timeout = timeout
+        self.dirty = DirtyList(prefix)
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def _sketch_key(self, pk):
+        return f'{self.prefix}:sketch:{pk}'
+
+    def _lock(self, key):
+        # Held for a get and a set; a few short retries cover contention
+        for _ in range(50):
+            if cache.add(key, 1, 5):
+                return True
+            time.sleep(0.001)
+        return False
+
+    def add(self, pk, item):
+        """Record an item, e.g. a viewer id, against an object; False if it was dropped"""
+        pk = str(pk)
+        key = self._sketch_key(pk)
+        lock_key = f'{key}:lock'
+        if not self._lock(lock_key):
+            # An estimate can miss the odd viewer; a page view should not wait longer
+            return False
+
+        try:
+            sketch = HyperLogLog.from_bytes(cache.get(key))
+            sketch.add(item)
+            cache.set(key, sketch.to_bytes(), self.timeout)
+        finally:
+            cache.delete(lock_key)
+        self.dirty.mark(pk)
+        return True
+
+    def sketch(self, instance):
+        """Stored sketch merged with the one waiting in the cache"""
+        sketch = HyperLogLog.from_bytes(getattr(instance, self.field))
+        return sketch.merge(HyperLogLog.from_bytes(cache.get(self._sketch_key(instance.pk))))
+
+    def merged(self, instances):
+        """One sketch covering every given object, e.g. for a per-recipient rollup"""
+        instances = list(instances)
+        cached = cache.get_many([self._sketch_key(instance.pk) for instance in instances])
+        total = HyperLogLog()
+        for instance in instances:
+            total.merge(HyperLogLog.from_bytes(getattr(instance, self.field)))
+            total.merge(HyperLogLog.from_bytes(cached.get(self._sketch_key(instance.pk))))
+        return total
+
+    def estimate(self, instance):
+        return self.sketch(instance).count()
+
+    def flush(self, chunk_size=500):
+        """Merge cached sketches into the stored ones and return the number of rows written"""
+        pks = self.dirty.drain() or []
+
+        written = 0
+        for offset in range(0, len(pks), chunk_size):
+            chunk = pks[offset:offset + chunk_size]
+            self.dirty.unmark(chunk)
+            cached = cache.get_many([self._sketch_key(pk) for pk in chunk])
+
+            with transaction.atomic():
+                rows = self.model._base_manager.filter(pk__in=chunk).select_for_update()
+                for pk, stored in rows.values_list('pk', self.field):
+                    pending = cached.get(self._sketch_key(str(pk)))
+                    if pending is None:
+                        continue
+                    sketch = HyperLogLog.from_bytes(stored).merge(HyperLogLog.from_bytes(pending))
+                    self.model._base_manager.filter(pk=pk).update(**{self.field: sketch.to_bytes()})
+                    written += 1
+
+        return written
+
+
+wish_counters = CounterBuffer('wishes.BirthdayWish', ['views_count', 'likes_count'], prefix='wish_counters')
+wish_viewers = SketchBuffer('wishes.BirthdayWish', 'viewer_sketch', prefix='wish_viewers')
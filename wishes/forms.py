@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth.models import User
+from django.urls import reverse
 from .models import (
     UserProfile, BirthdayWish, GroupWish, GroupWishContribution,
     CalendarEvent, WishTemplate
@@ -7,6 +8,26 @@ from .models import (
 from datetime import datetime, timedelta
 
 
+class UserAutocompleteWidget(forms.Widget):
+    """Searches users by name as you type and submits only the chosen user's id"""
+    template_name = 'widgets/user_autocomplete.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        label = ''
+        if value not in (None, ''):
+            try:
+                label = User.objects.filter(pk=value).values_list('username', flat=True).first() or ''
+            except (TypeError, ValueError):
+                pass
+        context['widget'].update({
+            'url': reverse('user_autocomplete'),
+            'label': label,
+            'placeholder': 'Start typing a name...',
+        })
+        return context
+
+
 class UserProfileForm(forms.ModelForm):
     """User profile form with birthday and preferences"""
 
@@ -38,7 +59,7 @@ class BirthdayWishForm(forms.ModelForm):
 
     recipient = forms.ModelChoiceField(
         queryset=User.objects.all(),
-        widget=forms.Select(attrs={
+        widget=UserAutocompleteWidget(attrs={
             'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:border-purple-500'
         })
     )
@@ -92,7 +113,7 @@ class GroupWishForm(forms.ModelForm):
                 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:border-purple-500',
                 'placeholder': 'e.g., Birthday Surprise for John'
             }),
-            'recipient': forms.Select(attrs={
+            'recipient': UserAutocompleteWidget(attrs={
                 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:border-purple-500'
             }),
             'description': forms.Textarea(attrs={
@@ -127,14 +148,19 @@ class VoiceMessageForm(forms.Form):
 class CalendarEventForm(forms.ModelForm):
     """Form for creating calendar events"""
 
+    # The picker works in user ids; clean_birthday_person maps the choice to its profile
+    birthday_person = forms.ModelChoiceField(
+        queryset=User.objects.all(),
+        widget=UserAutocompleteWidget(attrs={
+            'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:border-purple-500'
+        })
+    )
+
     class Meta:
         model = CalendarEvent
         fields = ['birthday_person', 'event_title', 'event_date',
                   'reminder_time', 'notes', 'location']
         widgets = {
-            'birthday_person': forms.Select(attrs={
-                'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:border-purple-500'
-            }),
             'event_title': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:border-purple-500',
                 'placeholder': 'Birthday Party'
@@ -157,3 +183,14 @@ class CalendarEventForm(forms.ModelForm):
                 'placeholder': 'Event location'
             }),
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        if self.instance.birthday_person_id:
+            self.initial['birthday_person'] = self.instance.birthday_person.user_id
+
+    def clean_birthday_person(self):
+        user = self.cleaned_data['birthday_person']
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        return profile
@@ -0,0 +1,41 @@
+import time
+
+from django.core.cache import cache
+
+from .ics import get_feed_version
+
+WISHES = 'wishes'
+GROUPS = 'groups'
+VERSION_KEY = 'fragment_version:{kind}:{user_id}'
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def get_fragment_versions(user_id):
+    """
+    Version stamps for a user's cached dashboard fragments.
+
+    'wishes' moves when a wish the user sent or received changes, 'groups'
+    when one of their group wishes does and 'contacts' follows the user's
+    contacts feed version.
+    """
+    keys = {kind: VERSION_KEY.format(kind=kind, user_id=user_id) for kind in (WISHES, GROUPS)}
+    stored = cache.get_many(keys.values())
+
+    versions = {}
+    for kind, key in keys.items():
+        if key not in stored:
+            # Start from the current time so a flushed cache never repeats a version
+            cache.add(key, time.time_ns(), None)
+        versions[kind] = stored.get(key) or cache.get(key, 0)
+
+    versions['contacts'], _ = get_feed_version(user_id)
+    return versions
+
+
+def bump_fragment_version(kind, user_ids):
+    """Mark the given users' fragments of one kind as changed"""
+    now = time.time_ns()
+    cache.set_many({
+        VERSION_KEY.format(kind=kind, user_id=user_id): now
+        for user_id in set(user_ids) if user_id is not None
+    }, None)
@@ -32,4 +32,11 @@ def health_check(request):
     except Exception as e:
         status['redis'] = f'error: {str(e)}'
 
+    # Outbound notification token buckets
+    try:
+        from .ratelimit import snapshot
+        status['rate_limits'] = snapshot()
+    except Exception as e:
+        status['rate_limits'] = f'error: {str(e)}'
+
     return JsonResponse(status)
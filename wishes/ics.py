@@ -0,0 +1,142 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core import signing
+from django.core.cache import cache
+
+TOKEN_SALT = 'wishes.ics'
+VERSION_KEY = 'ics_feed_version:{user_id}'
+BODY_KEY = 'ics_feed_body:{user_id}:{version}'
+BODY_TIMEOUT = 60 * 60 * 24
+
+
+def feed_token(user):
+    """Signed token identifying a user's feed without a database lookup"""
+    return signing.Signer(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def user_id_for_token(token):
+    """Return the user id a feed token was issued for, or None if tampered"""
+    try:
+        return int(signing.Signer(salt=TOKEN_SALT).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def get_feed_version(user_id):
+    """Return (version, last modified timestamp) of a user's feed"""
+    key = VERSION_KEY.format(user_id=user_id)
+    state = cache.get(key)
+    if state is None:
+        # Start from the current time so a flushed cache never repeats an ETag
+        cache.add(key, (time.time_ns(), int(time.time())), None)
+        state = cache.get(key) or (0, int(time.time()))
+    return state
+
+
+def bump_feed_version(user_ids):
+    """Mark the feeds of the given users as changed"""
+    now = int(time.time())
+    cache.set_many({
+        VERSION_KEY.format(user_id=user_id): (time.time_ns(), now)
+        for user_id in user_ids
+    }, None)
+
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Fold a content line to 75 octets as RFC 5545 requires"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _stamp(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def iter_feed(user_id, last_modified):
+    """Yield the ICS document for a user's contacts' birthdays and calendar events"""
+    from .models import CalendarEvent, UserProfile
+
+    dtstamp = _stamp(datetime.fromtimestamp(last_modified, dt_timezone.utc))
+
+    yield _fold('BEGIN:VCALENDAR')
+    yield _fold('VERSION:2.0')
+    yield _fold('PRODID:-//Birthday Wishes Pro//Birthdays//EN')
+    yield _fold('CALSCALE:GREGORIAN')
+    yield _fold('X-WR-CALNAME:Birthdays')
+
+    profiles = UserProfile.objects.filter(
+        user__followers__owner_id=user_id, birthday__isnull=False
+    ).select_related('user').order_by('birthday_ordinal')
+
+    for profile in profiles.iterator(chunk_size=500):
+        name = profile.user.get_full_name() or profile.user.username
+        if (profile.birthday.month, profile.birthday.day) == (2, 29):
+            rule = 'RRULE:FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=-1'
+        else:
+            rule = 'RRULE:FREQ=YEARLY'
+
+        yield _fold('BEGIN:VEVENT')
+        yield _fold(f'UID:birthday-{profile.pk}@birthday-wishes')
+        yield _fold(f'DTSTAMP:{dtstamp}')
+        yield _fold(f'DTSTART;VALUE=DATE:{profile.birthday:%Y%m%d}')
+        yield _fold(rule)
+        yield _fold(f"SUMMARY:{_escape(name)}'s Birthday")
+        yield _fold('TRANSP:TRANSPARENT')
+        yield _fold('END:VEVENT')
+
+    events = CalendarEvent.objects.filter(user_id=user_id).order_by('event_date')
+    for event in events.iterator(chunk_size=500):
+        yield _fold('BEGIN:VEVENT')
+        yield _fold(f'UID:event-{event.pk}@birthday-wishes')
+        yield _fold(f'DTSTAMP:{dtstamp}')
+        yield _fold(f'DTSTART:{_stamp(event.event_date)}')
+        yield _fold(f'SUMMARY:{_escape(event.event_title)}')
+        if event.location:
+            yield _fold(f'LOCATION:{_escape(event.location)}')
+        if event.notes:
+            yield _fold(f'DESCRIPTION:{_escape(event.notes)}')
+        yield _fold('END:VEVENT')
+
+    yield _fold('END:VCALENDAR')
+
+
+def cached_feed(user_id):
+    """
+    Return the feed as a cached string, or a generator that streams it.
+
+    The generator stores the finished document in the cache so the next
+    poll for the same version is served without touching the database.
+    """
+    version, last_modified = get_feed_version(user_id)
+    key = BODY_KEY.format(user_id=user_id, version=version)
+
+    body = cache.get(key)
+    if body is not None:
+        return body
+
+    def stream():
+        chunks = []
+        for chunk in iter_feed(user_id, last_modified):
+            chunks.append(chunk)
+            yield chunk
+        cache.set(key, ''.join(chunks), BODY_TIMEOUT)
+
+    return stream()
@@ -0,0 +1,112 @@
+import re
+
+from django.utils.crypto import salted_hmac
+from django.utils.functional import cached_property
+
+STATS_FIELDS = ('sent_count', 'received_count')
+
+
+class WishStatsLoader:
+    """
+    Request-scoped batch loader for per-user wish counters.
+
+    Template tags ask the loader for a count and get back a LazyWishCount.
+    Rendered into a page it becomes a placeholder, and once the response is
+    complete every placeholder on it is filled from one UserWishStats query.
+    Counts that are never rendered are never fetched.
+    """
+
+    def __init__(self):
+        self.pending = set()
+        self.loaded = {}
+
+    @cached_property
+    def marker(self):
+        # Derived from SECRET_KEY so page content cannot forge a placeholder
+        return salted_hmac('wishes.loaders', 'wish-stats').hexdigest()[:16]
+
+    @cached_property
+    def pattern(self):
+        return re.compile(rf'@@{self.marker}:(\d+):({"|".join(STATS_FIELDS)})@@')
+
+    def load(self, user_id, field):
+        """Queue a user's counter and return a lazy value for it"""
+        if user_id not in self.loaded:
+            self.pending.add(user_id)
+        return LazyWishCount(self, user_id, field)
+
+    def placeholder(self, user_id, field):
+        return f'@@{self.marker}:{user_id}:{field}@@'
+
+    def fetch(self, user_ids):
+        """Load counters for the given users, and anything queued, in one query"""
+        from .models import UserWishStats
+
+        wanted = (set(user_ids) | self.pending) - self.loaded.keys()
+        self.pending.clear()
+        if not wanted:
+            return
+
+        rows = UserWishStats.objects.filter(user_id__in=wanted).values_list('user_id', *STATS_FIELDS)
+        for user_id, *counts in rows:
+            self.loaded[user_id] = dict(zip(STATS_FIELDS, counts))
+        for user_id in wanted - self.loaded.keys():
+            self.loaded[user_id] = dict.fromkeys(STATS_FIELDS, 0)
+
+    def value(self, user_id, field):
+        if user_id not in self.loaded:
+            self.fetch([user_id])
+        return self.loaded[user_id][field]
+
+    def resolve(self, content):
+        """Replace every placeholder in rendered text with its count"""
+        matches = self.pattern.findall(content)
+        if not matches:
+            return content
+
+        self.fetch(int(user_id) for user_id, _ in matches)
+        return self.pattern.sub(lambda m: str(self.loaded[int(m[1])][m[2]]), content)
+
+
+class LazyWishCount:
+    """A counter that renders as a placeholder and evaluates only when used as a number"""
+
+    __slots__ = ('loader', 'user_id', 'field')
+
+    def __init__(self, loader, user_id, field):
+        self.loader = loader
+        self.user_id = user_id
+        self.field = field
+
+    def __int__(self):
+        return self.loader.value(self.user_id, self.field)
+
+    def __index__(self):
+        return int(self)
+
+    def __eq__(self, other):
+        return int(self) == other
+
+    def __lt__(self, other):
+        return int(self) < other
+
+    def __le__(self, other):
+        return int(self) <= other
+
+    def __gt__(self, other):
+        return int(self) > other
+
+    def __ge__(self, other):
+        return int(self) >= other
+
+    def __bool__(self):
+        return bool(int(self))
+
+    def __hash__(self):
+        return hash((self.user_id, self.field))
+
+    def __str__(self):
+        return self.loader.placeholder(self.user_id, self.field)
+
+    def __html__(self):
+        return str(self)
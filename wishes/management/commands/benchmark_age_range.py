@@ -0,0 +1,83 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from wishes.birthdays import birthday_ordinal
+from wishes.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Benchmark UserProfile.objects.get_by_age_range against growing profile counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10000,100000,1000000',
+            help='Comma separated profile counts to measure (default: 10000,100000,1000000; '
+                 'generating the 1M profiles takes about 7 minutes on SQLite)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Number of timed queries per size (default: 20)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert while generating profiles (default: 5000)'
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+
+        # Everything runs in one transaction that is rolled back at the end,
+        # so the generated profiles never outlive the benchmark.
+        with transaction.atomic():
+            created = 0
+            for size in sizes:
+                self.generate_profiles(created, size, options['batch_size'])
+                created = size
+                self.report(size, options['repeat'])
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, generated data rolled back'))
+
+    def generate_profiles(self, start, stop, batch_size):
+        """Create synthetic users and profiles numbered [start, stop)"""
+        rng = random.Random(start)
+        earliest = date(1940, 1, 1)
+
+        for offset in range(start, stop, batch_size):
+            count = min(batch_size, stop - offset)
+            users = User.objects.bulk_create([
+                User(username=f'bench_age_{offset + i}', password='!')
+                for i in range(count)
+            ])
+
+            profiles = []
+            for user in users:
+                birthday = earliest + timedelta(days=rng.randrange(80 * 365))
+                profiles.append(UserProfile(
+                    user=user,
+                    birthday=birthday,
+                    birthday_ordinal=birthday_ordinal(birthday),
+                ))
+            UserProfile.objects.bulk_create(profiles)
+
+    def report(self, size, repeat):
+        """Time the first page of a typical age band"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(UserProfile.objects.get_by_age_range(25, 34).order_by('birthday')[:50])
+            timings.append(time.perf_counter() - started)
+
+        timings.sort()
+        median = timings[len(timings) // 2] * 1000
+        self.stdout.write(f'{size:>9} profiles: median {median:.2f} ms per page of 50')
@@ -0,0 +1,132 @@
+import socket
+import socketserver
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from wishes.models import BirthdayWish
+from wishes.utils import build_birthday_notification, send_birthday_notifications
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept and discard messages, with a delay per reply"""
+
+    def setup(self):
+        super().setup()
+        # Multi-line replies would otherwise stall on Nagle + delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def reply(self, line):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost benchmark sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.messages += 1
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), SinkHandler)
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+
+
+class Command(BaseCommand):
+    help = 'Compare per-message SMTP connections with pooled batched delivery against a local SMTP stand-in'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=500,
+            help='Number of notifications to send per run (default: 500)'
+        )
+        parser.add_argument(
+            '--batch-sizes',
+            default='10,100',
+            help='Comma separated messages per connection for pooled runs (default: 10,100)'
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=1.0,
+            help='Milliseconds the stand-in waits before each reply, to mimic a network round trip (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+
+        server = SinkServer(options['latency'] / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+
+        # Unsaved instances: rendering needs no database rows
+        sender = User(username='bench_sender', first_name='Bench', last_name='Sender')
+        wishes = [
+            BirthdayWish(sender=sender, recipient=User(username=f'bench_{i}', email=f'bench_{i}@example.com'),
+                         text_content='Happy birthday!')
+            for i in range(count)
+        ]
+
+        def connection():
+            return get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host=host, port=port, username='', password='',
+                use_tls=False, use_ssl=False, fail_silently=False,
+            )
+
+        self.stdout.write(f'Sending {count} notifications to a local SMTP stand-in on port {port}')
+        self.stdout.write(f'{"mode":<20}{"connections":>12}{"delivered":>11}{"seconds":>10}{"msg/s":>10}')
+
+        def run(label, send):
+            server.connections = server.messages = 0
+            started = time.perf_counter()
+            delivered = send()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label:<20}{server.connections:>12}{delivered:>11}{elapsed:>10.2f}{delivered / elapsed:>10.0f}'
+            )
+
+        # What send_mail per wish used to do: a fresh connection for every message
+        run('per message', lambda: sum(
+            connection().send_messages([build_birthday_notification(wish)]) for wish in wishes
+        ))
+        for batch_size in batch_sizes:
+            run(f'pooled, batch {batch_size}', lambda: sum(
+                send_birthday_notifications(wishes, batch_size=batch_size, connection=connection()).values()
+            ))
+
+        server.shutdown()
+        server.server_close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Benchmark finished (EMAIL_BATCH_SIZE is {settings.EMAIL_BATCH_SIZE})'
+        ))
@@ -0,0 +1,117 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from wishes.managers import record_wish_changes
+from wishes.models import BirthdayWish, GroupWish, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Compare UPDATE traffic of dirty-field saves against full-row saves for common write paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=500,
+            help='Number of objects saved per scenario (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+
+        # Everything runs in one transaction that is rolled back at the end,
+        # so the generated rows never outlive the benchmark.
+        with transaction.atomic():
+            users = self.generate(rows)
+
+            self.stdout.write(f'{"scenario":<28}{"mode":<8}{"updates":>9}{"columns":>9}{"sql bytes":>11}{"ms":>9}')
+            for name, model, scenario in [
+                ('wish.make_public', BirthdayWish, self.make_public),
+                ('group.generate_invitation', GroupWish, self.generate_invitation),
+                ('login (last_login)', UserProfile, self.login),
+                ('unchanged profile save', UserProfile, self.unchanged_profile),
+            ]:
+                for mode in ('full', 'dirty'):
+                    self.report(name, mode, model, scenario, users, full=(mode == 'full'))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, generated data rolled back'))
+
+    def generate(self, rows):
+        # create() rather than bulk_create() so the post_save signal adds profiles
+        return [User.objects.create(username=f'bench_write_{i}', password='!') for i in range(rows + 1)]
+
+    @staticmethod
+    def untrack(instance, full):
+        """Drop the load snapshot so save() falls back to writing the whole row"""
+        if full:
+            instance.__dict__.pop('_loaded_values', None)
+        return instance
+
+    def make_public(self, users, full):
+        sender = users[0]
+        BirthdayWish.objects.bulk_create([
+            BirthdayWish(sender=sender, recipient=user, text_content='Happy birthday!')
+            for user in users[1:]
+        ])
+        wishes = list(BirthdayWish.objects.filter(sender=sender))
+        # bulk_create skips save(), so count the new wishes the way save() would
+        record_wish_changes([(None, wish._stats_key) for wish in wishes])
+        with self.capture() as captured:
+            for wish in wishes:
+                wish = self.untrack(wish, full)
+                wish.is_public = True
+                wish.save()
+        BirthdayWish.objects.filter(sender=sender).delete()
+        return captured
+
+    def generate_invitation(self, users, full):
+        deadline = timezone.now() + timedelta(days=7)
+        GroupWish.objects.bulk_create([
+            GroupWish(title=f'Group {i}', recipient=user, creator=users[0], deadline=deadline,
+                      scheduled_send_date=deadline, invitation_code=f'BENCH{i:07d}')
+            for i, user in enumerate(users[1:])
+        ])
+        groups = list(GroupWish.objects.filter(creator=users[0]))
+        with self.capture() as captured:
+            for group in groups:
+                self.untrack(group, full).generate_invitation_code()
+        GroupWish.objects.filter(creator=users[0]).delete()
+        return captured
+
+    def login(self, users, full):
+        loaded = list(User.objects.filter(pk__in=[u.pk for u in users[1:]]).select_related('profile'))
+        with self.capture() as captured:
+            for user in loaded:
+                self.untrack(user.profile, full)
+                user.last_login = timezone.now()
+                user.save(update_fields=['last_login'])
+        return captured
+
+    def unchanged_profile(self, users, full):
+        loaded = list(User.objects.filter(pk__in=[u.pk for u in users[1:]]).select_related('profile'))
+        with self.capture() as captured:
+            for user in loaded:
+                self.untrack(user.profile, full).save()
+        return captured
+
+    def capture(self):
+        return CaptureQueriesContext(connection)
+
+    def report(self, name, mode, model, scenario, users, full):
+        started = time.perf_counter()
+        captured = scenario(users, full)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        # Only the scenario's own table; counter maintenance is the same in both modes
+        prefix = f'UPDATE {connection.ops.quote_name(model._meta.db_table)} '
+        updates = [query['sql'] for query in captured.captured_queries if query['sql'].startswith(prefix)]
+        columns = sum(sql.split(' SET ', 1)[1].split(' WHERE ', 1)[0].count(' = ') for sql in updates)
+        size = sum(len(sql) for sql in updates)
+        self.stdout.write(f'{name:<28}{mode:<8}{len(updates):>9}{columns:>9}{size:>11}{elapsed:>9.1f}')
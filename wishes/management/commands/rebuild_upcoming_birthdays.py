@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from wishes.models import UpcomingBirthday
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized upcoming birthdays table from user profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of profiles processed per batch (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding upcoming birthdays...')
+
+        rebuilt = UpcomingBirthday.objects.rebuild(chunk_size=options['chunk_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {rebuilt} upcoming birthdays'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from wishes.models import UserWishStats
+
+
+class Command(BaseCommand):
+    help = 'Reconcile the per-user wish counters by recounting BirthdayWish rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of users recounted per batch (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding wish stats...')
+
+        rebuilt = UserWishStats.objects.rebuild(chunk_size=options['chunk_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt wish stats for {rebuilt} users'))
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from wishes.models import UserProfile
+from wishes.models import UpcomingBirthday
 from wishes.utils import send_birthday_notification
 
 
@@ -19,20 +19,19 @@ class Command(BaseCommand):
         days = options['days']
         self.stdout.write(f'Checking for birthdays in the next {days} days...')
 
-        profiles = UserProfile.objects.get_upcoming_birthdays(days=days)
+        upcoming = UpcomingBirthday.objects.within(days=days)
+        today = timezone.now().date()
 
         count = 0
-        for profile in profiles:
-            next_birthday = profile.get_next_birthday()
-            days_until = (next_birthday - timezone.now().date()).days
-
-            if days_until <= days:
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Birthday reminder: {profile.user.username} - {days_until} days'
-                    )
+        for entry in upcoming:
+            days_until = (entry.next_date - today).days
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Birthday reminder: {entry.profile.user.username} - {days_until} days'
                 )
-                count += 1
+            )
+            count += 1
 
         self.stdout.write(
             self.style.SUCCESS(f'Successfully processed {count} birthday reminders'))
@@ -1,32 +1,58 @@
-from django.db import models
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
 
+from .birthdays import birthday_facts, ordinal_ranges, years_before
+from .fragments import WISHES, bump_fragment_version
+
+# What a wish contributes to the wish counters; sent_date and created_at
+# date a sent wish in the site-wide daily counters
+WishStatsKey = namedtuple(
+    'WishStatsKey', ['sender_id', 'recipient_id', 'status', 'wish_type', 'sent_date', 'created_at']
+)
+
 
 class BirthdayManager(models.Manager):
     """Custom manager for birthday-related queries"""
 
     def get_upcoming_birthdays(self, days=30):
-        """Get birthdays within the next 'days' days"""
+        """Get birthdays within the next 'days' days, soonest first"""
         today = timezone.now().date()
-        upcoming = []
+        ranges = ordinal_ranges(today, days)
 
-        profiles = self.exclude(birthday__isnull=True)
+        window = Q()
+        for low, high in ranges:
+            window |= Q(birthday_ordinal__range=(low, high))
+
+        # Birthdays that already passed this year belong to the wrapped
+        # (January) part of the window and sort after the December part.
+        wrapped = Case(
+            When(birthday_ordinal__lt=ranges[0][0], then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+        return self.filter(window).select_related('user').annotate(
+            wrapped=wrapped
+        ).order_by('wrapped', 'birthday_ordinal')
 
-        for profile in profiles:
-            if profile.birthday:
-                next_birthday = profile.get_next_birthday()
-                if next_birthday and (next_birthday - today).days <= days:
-                    upcoming.append(profile)
+    def get_upcoming_birthdays_for(self, user, days=30):
+        """Get upcoming birthdays limited to the given user's contacts"""
+        return self.get_upcoming_birthdays(days=days).filter(user__followers__owner=user)
 
-        return sorted(upcoming, key=lambda x: x.get_next_birthday())
+    def get_contact_profile_ids(self, user):
+        """Ids of the profiles the given user follows"""
+        return set(self.filter(user__followers__owner=user).values_list('pk', flat=True))
 
     def get_today_birthdays(self):
         """Get all birthdays that occur today"""
         today = timezone.now().date()
-        return self.filter(
-            birthday__month=today.month,
-            birthday__day=today.day
-        )
+        low, high = ordinal_ranges(today, 0)[0]
+        return self.filter(birthday_ordinal__range=(low, high))
 
     def get_this_month_birthdays(self):
         """Get all birthdays in the current month"""
@@ -34,27 +60,371 @@ class BirthdayManager(models.Manager):
         return self.filter(birthday__month=today.month)
 
     def get_by_age_range(self, min_age=None, max_age=None):
-        """Filter profiles by age range"""
+        """Filter profiles by age range (inclusive) using birthday bounds"""
         today = timezone.now().date()
-        profiles = []
-
-        for profile in self.exclude(birthday__isnull=True):
-            age = profile.get_age()
-            if age:
-                if min_age and max_age:
-                    if min_age <= age <= max_age:
-                        profiles.append(profile)
-                elif min_age:
-                    if age >= min_age:
-                        profiles.append(profile)
-                elif max_age:
-                    if age <= max_age:
-                        profiles.append(profile)
+        profiles = self.exclude(birthday__isnull=True)
+
+        # Anyone born on or before this date is at least min_age
+        if min_age is not None:
+            profiles = profiles.filter(birthday__lte=years_before(today, min_age))
+
+        # Anyone born on or before this date is already older than max_age
+        if max_age is not None:
+            profiles = profiles.filter(birthday__gt=years_before(today, max_age + 1))
 
         return profiles
 
 
-class WishManager(models.Manager):
+class UpcomingBirthdayManager(models.Manager):
+    """Custom manager for the materialized upcoming birthdays table"""
+
+    def within(self, days=30):
+        """Rows whose next birthday falls in the next 'days' days, soonest first"""
+        today = timezone.now().date()
+        return self.filter(
+            next_date__range=(today, today + timedelta(days=days))
+        ).select_related('profile__user').order_by('next_date')
+
+    def within_for(self, user, days=30):
+        """Upcoming rows limited to the given user's contacts"""
+        return self.within(days=days).filter(profile__user__followers__owner=user)
+
+    def row_values(self, birthday, today):
+        """Column values for a single birthday as of 'today'"""
+        facts = birthday_facts([birthday], today)[0]
+        return {
+            'next_date': facts.next_birthday,
+            'days_until': facts.days_until,
+            'age_turning': facts.age + (1 if facts.days_until else 0),
+            'refreshed_on': today,
+        }
+
+    def sync_profile(self, profile):
+        """Update (or drop) the single row belonging to a profile"""
+        if not profile.birthday:
+            self.filter(profile=profile).delete()
+            return
+
+        today = timezone.now().date()
+        self.update_or_create(profile=profile, defaults=self.row_values(profile.birthday, today))
+
+    def roll_forward(self, chunk_size=1000):
+        """
+        Advance every row to today.
+
+        Rows whose birthday is still ahead only need days_until shifted, which
+        is one UPDATE per distinct refresh date. Only rows whose birthday has
+        passed are recomputed, in chunks. Rows whose profile lost its birthday
+        without save() (e.g. a queryset update) are dropped first.
+        """
+        today = timezone.now().date()
+        self.exclude(profile__birthday__isnull=False).delete()
+
+        stale_dates = self.filter(refreshed_on__lt=today).values_list('refreshed_on', flat=True).distinct()
+        for refreshed_on in list(stale_dates):
+            elapsed = (today - refreshed_on).days
+            self.filter(refreshed_on=refreshed_on, next_date__gte=today).update(
+                days_until=F('days_until') - elapsed, refreshed_on=today
+            )
+
+        passed = self.filter(next_date__lt=today).select_related('profile')
+        rolled = 0
+        while True:
+            rows = list(passed[:chunk_size])
+            if not rows:
+                break
+            for row in rows:
+                for field, value in self.row_values(row.profile.birthday, today).items():
+                    setattr(row, field, value)
+            self.bulk_update(rows, ['next_date', 'days_until', 'age_turning', 'refreshed_on'])
+            rolled += len(rows)
+
+        return rolled
+
+    def rebuild(self, chunk_size=1000):
+        """Recreate every row from UserProfile, one chunk of profiles at a time"""
+        from .models import UserProfile
+
+        today = timezone.now().date()
+        self.exclude(profile__birthday__isnull=False).delete()
+
+        profiles = UserProfile.objects.exclude(birthday__isnull=True).order_by('pk')
+        last_pk = 0
+        rebuilt = 0
+        while True:
+            chunk = list(profiles.filter(pk__gt=last_pk).only('pk', 'birthday')[:chunk_size])
+            if not chunk:
+                break
+            self.bulk_create(
+                [self.model(profile=p, **self.row_values(p.birthday, today)) for p in chunk],
+                update_conflicts=True,
+                unique_fields=['profile'],
+                update_fields=['next_date', 'days_until', 'age_turning', 'refreshed_on'],
+            )
+            last_pk = chunk[-1].pk
+            rebuilt += len(chunk)
+
+        return rebuilt
+
+
+class UserWishStatsManager(models.Manager):
+    """Custom manager for the denormalized per-user wish counters"""
+
+    def for_user(self, user):
+        """The user's counters, or an unsaved all-zero row if none exist yet"""
+        return self.filter(user=user).first() or self.model(user=user)
+
+    def _counter_deltas(self, key, sign, totals):
+        """Add the counters a WishStatsKey contributes"""
+        if key is None:
+            return
+        if key.status == 'sent':
+            totals[key.sender_id]['sent_count'] += sign
+            totals[key.recipient_id]['received_count'] += sign
+        elif key.status == 'scheduled':
+            totals[key.sender_id]['scheduled_count'] += sign
+
+    def record(self, changes):
+        """
+        Apply wish changes to the counters with F() expressions.
+
+        Each change is an (old, new) pair of WishStatsKey, where None stands
+        for a wish that was created or deleted.
+        """
+        totals = defaultdict(lambda: defaultdict(int))
+        for old, new in changes:
+            self._counter_deltas(old, -1, totals)
+            self._counter_deltas(new, 1, totals)
+
+        with transaction.atomic(using=self.db):
+            for user_id, deltas in totals.items():
+                deltas = {field: delta for field, delta in deltas.items() if delta}
+                if not deltas:
+                    continue
+                expressions = {field: F(field) + delta for field, delta in deltas.items()}
+                if self.filter(user_id=user_id).update(**expressions):
+                    continue
+                # First counted wish for this user; never create rows on the way down
+                if any(delta > 0 for delta in deltas.values()):
+                    self.bulk_create([self.model(user_id=user_id)], ignore_conflicts=True)
+                    self.filter(user_id=user_id).update(**expressions)
+
+    def rebuild(self, chunk_size=1000):
+        """Recount every user's counters from BirthdayWish, one chunk of users at a time"""
+        from django.contrib.auth.models import User
+        from .models import BirthdayWish
+
+        rebuilt = 0
+        last_pk = 0
+        while True:
+            user_ids = list(User.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not user_ids:
+                break
+
+            def counts(field, status):
+                return dict(BirthdayWish.objects.filter(
+                    **{f'{field}__in': user_ids}, status=status
+                ).values_list(field).annotate(total=Count('pk')).order_by())
+
+            sent = counts('sender_id', 'sent')
+            received = counts('recipient_id', 'sent')
+            scheduled = counts('sender_id', 'scheduled')
+
+            self.bulk_create(
+                [self.model(user_id=pk, sent_count=sent.get(pk, 0), received_count=received.get(pk, 0),
+                            scheduled_count=scheduled.get(pk, 0)) for pk in user_ids],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['sent_count', 'received_count', 'scheduled_count'],
+            )
+            last_pk = user_ids[-1]
+            rebuilt += len(user_ids)
+
+        return rebuilt
+
+
+class SiteWishStatManager(models.Manager):
+    """Custom manager for the site-wide sent wish counters"""
+
+    def record(self, changes):
+        """
+        Count wishes entering or leaving 'sent' against the row for their type
+        and the day they were sent.
+
+        Takes the same (old, new) key pairs as UserWishStatsManager.record and
+        dates each wish the way rebuild() does. The cached totals are adjusted
+        once the transaction commits.
+        """
+        from . import site_stats
+
+        deltas = defaultdict(int)
+        for old, new in changes:
+            if old is not None and old.status == 'sent':
+                deltas[self._sent_day(old), old.wish_type] -= 1
+            if new is not None and new.status == 'sent':
+                deltas[self._sent_day(new), new.wish_type] += 1
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        totals = defaultdict(int)
+        with transaction.atomic(using=self.db):
+            for (day, wish_type), delta in deltas.items():
+                totals[wish_type] += delta
+                rows = self.filter(day=day, wish_type=wish_type)
+                if not rows.update(sent_count=F('sent_count') + delta):
+                    self.bulk_create([self.model(day=day, wish_type=wish_type)], ignore_conflicts=True)
+                    rows.update(sent_count=F('sent_count') + delta)
+            transaction.on_commit(lambda: site_stats.apply_deltas(totals), using=self.db)
+
+    @staticmethod
+    def _sent_day(key):
+        """Local date a wish was sent on, falling back to when it was created"""
+        sent_at = key.sent_date or key.created_at
+        return timezone.localdate(sent_at) if sent_at else timezone.localdate()
+
+    def totals(self):
+        """Sent wishes per wish type, summed over every day"""
+        return dict(self.values_list('wish_type').annotate(total=Sum('sent_count')).order_by())
+
+    def rebuild(self):
+        """Recount every day from BirthdayWish, dating each wish by when it was sent"""
+        from .models import BirthdayWish
+
+        rows = BirthdayWish.objects.filter(status='sent').annotate(
+            day=TruncDate(Coalesce('sent_date', 'created_at'))
+        ).values_list('day', 'wish_type').annotate(total=Count('pk')).order_by()
+
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            self.bulk_create([
+                self.model(day=day, wish_type=wish_type, sent_count=total)
+                for day, wish_type, total in rows
+            ])
+
+        return self.count()
+
+
+def record_wish_changes(changes):
+    """Apply (old, new) wish key changes to the per-user and site-wide counters"""
+    from .models import SiteWishStat, UserWishStats
+
+    UserWishStats.objects.record(changes)
+    SiteWishStat.objects.record(changes)
+
+
+class UserSearchTermManager(models.Manager):
+    """Custom manager for the lowercased name prefixes behind user autocomplete"""
+
+    @staticmethod
+    def terms_for(user):
+        """Lowercased username, first, last and full name of a user"""
+        names = [user.username, user.first_name, user.last_name, f'{user.first_name} {user.last_name}']
+        return {name.strip().lower()[:150] for name in names if name.strip()}
+
+    def sync_user(self, user):
+        """Bring a user's terms in line with their current names"""
+        wanted = self.terms_for(user)
+        existing = set(self.filter(user=user).values_list('term', flat=True))
+        if wanted == existing:
+            return
+
+        with transaction.atomic(using=self.db):
+            self.filter(user=user, term__in=existing - wanted).delete()
+            self.bulk_create([self.model(user=user, term=term) for term in wanted - existing])
+
+    def search(self, prefix, limit=10, exclude_user=None):
+        """
+        Users with a name starting with 'prefix', best matches first.
+
+        Uses a range scan on the term index ([prefix, prefix + U+10FFFF)), so
+        it stays index-backed on every database and only reads a few rows
+        past the limit.
+        """
+        from django.contrib.auth.models import User
+
+        prefix = prefix.strip().lower()[:150]
+        if not prefix:
+            return []
+
+        terms = self.filter(term__gte=prefix, term__lt=prefix + '\U0010ffff')
+        if exclude_user is not None:
+            terms = terms.exclude(user=exclude_user)
+
+        ids = []
+        for user_id in terms.order_by('term', 'user_id').values_list('user_id', flat=True)[:limit * 4]:
+            if user_id not in ids:
+                ids.append(user_id)
+                if len(ids) == limit:
+                    break
+
+        users = User.objects.only('username', 'first_name', 'last_name').in_bulk(ids)
+        return [users[pk] for pk in ids if pk in users]
+
+
+class WishQuerySet(models.QuerySet):
+    """Queryset for birthday wishes"""
+
+    def transition(self, status, expected=None, **fields):
+        """
+        Compare-and-set status change, returning the primary keys this call moved.
+
+        Rows are moved from 'expected' (or from any other status) to 'status'
+        by one conditional UPDATE ... WHERE status = <expected>, with 'fields'
+        and updated_at set in the same statement. A row another caller moved
+        first no longer matches, so every transition has exactly one winner.
+
+        Django's update() only returns a row count, so rather than reading the
+        won rows back with UPDATE ... RETURNING, the matching rows are first
+        read under SELECT FOR UPDATE (their old keys are needed for the
+        counters anyway) and stay locked until the counters are adjusted. On
+        backends without row locks, like SQLite, a concurrent caller can move
+        some of those rows between the read and the write; the whole call is
+        then rolled back and claims nothing, and the rows it did not lose are
+        picked up by the next call.
+        """
+        fields.setdefault('updated_at', timezone.now())
+        with transaction.atomic(using=self.db):
+            moving = self.filter(status=expected) if expected is not None else self.exclude(status=status)
+            rows = {
+                pk: WishStatsKey(*key)
+                for pk, *key in moving.select_for_update().values_list('pk', *WishStatsKey._fields)
+            }
+            if not rows:
+                return []
+
+            pks = list(rows)
+            base = self.model._base_manager.using(self.db).filter(pk__in=pks)
+            current = base.filter(status=expected) if expected is not None else base.exclude(status=status)
+            if current.update(status=status, **fields) != len(rows):
+                # Only possible without row locks: a concurrent caller moved some
+                # rows between the read and the write. Claim nothing rather than guess.
+                transaction.set_rollback(True, using=self.db)
+                return []
+
+            moved = {name: value for name, value in fields.items() if name in WishStatsKey._fields}
+            changes = [(key, key._replace(status=status, **moved)) for key in rows.values()]
+            record_wish_changes(changes)
+            bump_fragment_version(WISHES, [user for _, new in changes for user in (new.sender_id, new.recipient_id)])
+
+        return pks
+
+    def update_status(self, status, **fields):
+        """Bulk status change that keeps the wish counters in step for the rows that moved"""
+        return len(self.transition(status, **fields))
+
+    def mark_as_sent(self, expected=None, now=None):
+        """Move rows to 'sent' and queue notifications for the ones this call won"""
+        from .models import Outbox
+
+        with transaction.atomic(using=self.db):
+            won = self.transition('sent', expected=expected, sent_date=now or timezone.now())
+            Outbox.objects.enqueue(won)
+
+        return won
+
+
+class WishManager(models.Manager.from_queryset(WishQuerySet)):
     """Custom manager for birthday wishes"""
 
     def get_sent_wishes(self):
@@ -65,14 +435,33 @@ class WishManager(models.Manager):
         """Get all scheduled wishes"""
         return self.filter(status='scheduled')
 
-    def get_pending_wishes(self):
+    def get_pending_wishes(self, now=None):
         """Get wishes scheduled for today or past"""
-        now = timezone.now()
+        now = now or timezone.now()
         return self.filter(
             status='scheduled',
             scheduled_date__lte=now
         )
 
+    def claim_pending_wishes(self, batch_size=100, now=None):
+        """
+        Mark up to batch_size due wishes as sent, queue their notifications and return their ids.
+
+        The oldest due rows are locked with SKIP LOCKED, so concurrent
+        dispatchers each claim a different batch instead of waiting on (or
+        double sending) one another's rows. Backends without row locks, like
+        SQLite, ignore the lock and serialize writers instead.
+        """
+        now = now or timezone.now()
+        with transaction.atomic(using=self.db):
+            ids = list(
+                self.get_pending_wishes(now).order_by('scheduled_date')
+                .select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return []
+            return self.filter(pk__in=ids).mark_as_sent(expected='scheduled', now=now)
+
     def get_user_sent_wishes(self, user):
         """Get wishes sent by a specific user"""
         return self.filter(sender=user, status='sent')
@@ -84,3 +473,83 @@ class WishManager(models.Manager):
     def get_public_wishes(self):
         """Get all public wishes"""
         return self.filter(is_public=True, status='sent')
+
+    def get_unique_viewers_for(self, recipient):
+        """Estimated distinct viewers across all of a recipient's public wishes"""
+        from .counters import wish_viewers
+
+        wishes = self.get_public_wishes().filter(recipient=recipient).only('pk', 'viewer_sketch')
+        return wish_viewers.merged(wishes).count()
+
+
+class OutboxManager(models.Manager):
+    """Custom manager for queued wish notifications"""
+
+    def enqueue(self, wish_ids):
+        """Queue notifications; call inside the transaction that marks the wishes sent"""
+        return self.bulk_create([self.model(wish_id=wish_id) for wish_id in wish_ids])
+
+    def claim(self, batch_size=100, lease=timedelta(minutes=5), now=None):
+        """
+        Lease up to batch_size due entries and return them with their wishes.
+
+        Each claim counts an attempt and pushes next_attempt_at past the
+        lease under SKIP LOCKED, so concurrent drainers take disjoint
+        batches and an entry whose worker died is retried once the lease
+        runs out.
+        """
+        now = now or timezone.now()
+        with transaction.atomic(using=self.db):
+            ids = list(
+                self.filter(failed_at__isnull=True, next_attempt_at__lte=now).order_by('next_attempt_at')
+                .select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return []
+            self.filter(pk__in=ids).update(attempts=F('attempts') + 1, next_attempt_at=now + lease)
+
+        return list(self.filter(pk__in=ids).select_related('wish__sender', 'wish__recipient'))
+
+    def defer(self, groups, now=None):
+        """
+        Push rate-limited entries back without spending an attempt.
+
+        groups maps a delay in seconds to the entries that should wait that long.
+        """
+        now = now or timezone.now()
+        with transaction.atomic(using=self.db):
+            for delay, entries in groups.items():
+                self.filter(pk__in=[entry.pk for entry in entries]).update(
+                    attempts=F('attempts') - 1, next_attempt_at=now + timedelta(seconds=delay)
+                )
+        return sum(len(entries) for entries in groups.values())
+
+    def settle(self, entries, results, max_attempts, retry_delay, now=None):
+        """
+        Record a drain batch's delivery results.
+
+        Delivered entries are removed. Failed ones are retried after
+        retry_delay seconds, doubling per attempt up to an hour. Entries
+        that used up max_attempts are kept with failed_at set; their wishes
+        were sent and stay that way.
+        Returns (delivered, retried, failed) counts.
+        """
+        now = now or timezone.now()
+        delivered, dead = [], []
+        retry = defaultdict(list)
+        for entry in entries:
+            if results.get(entry.wish_id):
+                delivered.append(entry.pk)
+            elif entry.attempts >= max_attempts:
+                dead.append(entry.pk)
+            else:
+                retry[entry.attempts].append(entry.pk)
+
+        with transaction.atomic(using=self.db):
+            for attempts, ids in retry.items():
+                delay = min(retry_delay * 2 ** (attempts - 1), 3600)
+                self.filter(pk__in=ids).update(next_attempt_at=now + timedelta(seconds=delay))
+            self.filter(pk__in=delivered).delete()
+            self.filter(pk__in=dead).update(failed_at=now)
+
+        return len(delivered), sum(len(ids) for ids in retry.values()), len(dead)
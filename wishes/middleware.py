@@ -70,3 +70,31 @@ class UserActivityMiddleware(MiddlewareMixin):
                 # profile.save(update_fields=['last_activity'])
             except UserProfile.DoesNotExist:
                 pass
+
+
+class WishStatsLoaderMiddleware(MiddlewareMixin):
+    """
+    Give each request a WishStatsLoader and fill the wish count
+    placeholders it left in the response with one query
+    """
+
+    @staticmethod
+    def process_request(request):
+        from wishes.loaders import WishStatsLoader
+
+        request.wish_stats = WishStatsLoader()
+
+    @staticmethod
+    def process_response(request, response):
+        loader = getattr(request, 'wish_stats', None)
+        if loader is None or response.streaming or 'text/' not in response.get('Content-Type', ''):
+            return response
+
+        content = response.content.decode(response.charset)
+        if loader.marker not in content:
+            return response
+
+        response.content = loader.resolve(content).encode(response.charset)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 5.0 on 2026-10-17 17:24
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractDay, ExtractMonth
+
+
+def backfill_birthday_ordinal(apps, schema_editor):
+    UserProfile = apps.get_model('wishes', 'UserProfile')
+    UserProfile.objects.exclude(birthday__isnull=True).update(
+        birthday_ordinal=ExtractMonth('birthday') * 100 + ExtractDay('birthday')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0002_giftsuggestion_wishtemplate_calendarevent_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='birthday_ordinal',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_birthday_ordinal, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0003_userprofile_birthday_ordinal'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='birthday',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
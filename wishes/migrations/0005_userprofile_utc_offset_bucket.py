@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-17 17:27
+
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_utc_offset_bucket(apps, schema_editor):
+    UserProfile = apps.get_model('wishes', 'UserProfile')
+    now = timezone.now()
+
+    for tz_name in UserProfile.objects.values_list('timezone', flat=True).distinct():
+        try:
+            offset = now.astimezone(ZoneInfo(tz_name)).utcoffset()
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+        UserProfile.objects.filter(timezone=tz_name).update(
+            utc_offset_bucket=int(offset.total_seconds() // 3600)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0004_userprofile_birthday_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='utc_offset_bucket',
+            field=models.SmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['utc_offset_bucket', 'birthday_ordinal'], name='wishes_user_utc_off_b1c93b_idx'),
+        ),
+        migrations.RunPython(backfill_utc_offset_bucket, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0 on 2026-10-17 17:30
+
+import calendar
+from datetime import date
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def next_birthday(birthday, today):
+    """Frozen copy of wishes.birthdays.birthday_facts for one birthday"""
+    ordinal = birthday.month * 100 + birthday.day
+    today_ordinal = today.month * 100 + today.day
+    observed = 228 if ordinal == 229 and not calendar.isleap(today.year) else ordinal
+
+    year = today.year if observed >= today_ordinal else today.year + 1
+    if ordinal == 229 and not calendar.isleap(year):
+        upcoming = date(year, 2, 28)
+    else:
+        upcoming = date(year, birthday.month, birthday.day)
+
+    age = today.year - birthday.year - (today_ordinal < observed)
+    return upcoming, (upcoming - today).days, age
+
+
+def populate_upcoming_birthdays(apps, schema_editor):
+    UserProfile = apps.get_model('wishes', 'UserProfile')
+    UpcomingBirthday = apps.get_model('wishes', 'UpcomingBirthday')
+    today = timezone.now().date()
+
+    profiles = UserProfile.objects.exclude(birthday__isnull=True).only('pk', 'birthday').iterator(chunk_size=1000)
+    rows = []
+    for profile in profiles:
+        next_date, days_until, age = next_birthday(profile.birthday, today)
+        rows.append(UpcomingBirthday(
+            profile_id=profile.pk,
+            next_date=next_date,
+            days_until=days_until,
+            age_turning=age + (1 if days_until else 0),
+            refreshed_on=today,
+        ))
+        if len(rows) == 1000:
+            UpcomingBirthday.objects.bulk_create(rows)
+            rows = []
+    UpcomingBirthday.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0006_contact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpcomingBirthday',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='upcoming_birthday', serialize=False, to='wishes.userprofile')),
+                ('next_date', models.DateField(db_index=True)),
+                ('days_until', models.PositiveSmallIntegerField()),
+                ('age_turning', models.SmallIntegerField()),
+                ('refreshed_on', models.DateField()),
+            ],
+            options={
+                'verbose_name': 'Upcoming Birthday',
+                'verbose_name_plural': 'Upcoming Birthdays',
+                'ordering': ['next_date'],
+            },
+        ),
+        migrations.RunPython(populate_upcoming_birthdays, migrations.RunPython.noop),
+    ]
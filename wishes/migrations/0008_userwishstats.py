@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-17 17:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_user_wish_stats(apps, schema_editor):
+    BirthdayWish = apps.get_model('wishes', 'BirthdayWish')
+    UserWishStats = apps.get_model('wishes', 'UserWishStats')
+
+    stats = {}
+    for field, status, counter in [
+        ('sender_id', 'sent', 'sent_count'),
+        ('recipient_id', 'sent', 'received_count'),
+        ('sender_id', 'scheduled', 'scheduled_count'),
+    ]:
+        rows = BirthdayWish.objects.filter(status=status).values_list(field).annotate(total=Count('pk')).order_by()
+        for user_id, total in rows:
+            stats.setdefault(user_id, UserWishStats(user_id=user_id))
+            setattr(stats[user_id], counter, total)
+
+    UserWishStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0007_upcomingbirthday'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserWishStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='wish_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('received_count', models.PositiveIntegerField(default=0)),
+                ('scheduled_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'User Wish Stats',
+                'verbose_name_plural': 'User Wish Stats',
+            },
+        ),
+        migrations.RunPython(populate_user_wish_stats, migrations.RunPython.noop),
+    ]
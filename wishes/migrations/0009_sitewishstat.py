@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-17 17:42
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def populate_site_wish_stats(apps, schema_editor):
+    BirthdayWish = apps.get_model('wishes', 'BirthdayWish')
+    SiteWishStat = apps.get_model('wishes', 'SiteWishStat')
+
+    rows = BirthdayWish.objects.filter(status='sent').annotate(
+        day=TruncDate(Coalesce('sent_date', 'created_at'))
+    ).values_list('day', 'wish_type').annotate(total=Count('pk')).order_by()
+
+    SiteWishStat.objects.bulk_create(
+        [SiteWishStat(day=day, wish_type=wish_type, sent_count=total) for day, wish_type, total in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0008_userwishstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteWishStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('wish_type', models.CharField(choices=[('text', 'Text Message'), ('voice', 'Voice Message'), ('video', 'Video Message'), ('card', 'Digital Card'), ('group', 'Group Wish')], max_length=10)),
+                ('sent_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Site Wish Stat',
+                'ordering': ['-day', 'wish_type'],
+                'unique_together': {('day', 'wish_type')},
+            },
+        ),
+        migrations.RunPython(populate_site_wish_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0009_sitewishstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='birthdaywish',
+            name='viewer_sketch',
+            field=models.BinaryField(null=True),
+        ),
+    ]
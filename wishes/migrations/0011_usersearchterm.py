@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-17 17:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_search_terms(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserSearchTerm = apps.get_model('wishes', 'UserSearchTerm')
+
+    terms = []
+    users = User.objects.only('username', 'first_name', 'last_name').order_by('pk')
+    for user in users.iterator(chunk_size=1000):
+        names = [user.username, user.first_name, user.last_name, f'{user.first_name} {user.last_name}']
+        for term in {name.strip().lower()[:150] for name in names if name.strip()}:
+            terms.append(UserSearchTerm(user_id=user.pk, term=term))
+        if len(terms) >= 1000:
+            UserSearchTerm.objects.bulk_create(terms)
+            terms = []
+    UserSearchTerm.objects.bulk_create(terms)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0010_birthdaywish_viewer_sketch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=150)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('term', 'user')},
+            },
+        ),
+        migrations.RunPython(populate_search_terms, migrations.RunPython.noop),
+    ]
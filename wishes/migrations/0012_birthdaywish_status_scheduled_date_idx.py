@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-17 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0011_usersearchterm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='birthdaywish',
+            index=models.Index(fields=['status', 'scheduled_date'], name='wishes_birt_status_1500db_idx'),
+        ),
+    ]
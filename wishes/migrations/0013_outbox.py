@@ -0,0 +1,53 @@
+# Generated by Django 5.0 on 2026-10-17 18:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('wishes', '0012_birthdaywish_status_scheduled_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Outbox',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                (
+                    'next_attempt_at',
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                (
+                    'wish',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='outbox_entries',
+                        to='wishes.birthdaywish',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Outbox Entry',
+                'verbose_name_plural': 'Outbox',
+                'ordering': ['next_attempt_at'],
+                'indexes': [
+                    models.Index(
+                        fields=['next_attempt_at'],
+                        name='wishes_outb_next_at_1d1805_idx',
+                    )
+                ],
+            },
+        ),
+    ]
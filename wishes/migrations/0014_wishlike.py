@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-17 18:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('wishes', '0013_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WishLike',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                (
+                    'user',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='wish_likes',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    'wish',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='likes',
+                        to='wishes.birthdaywish',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Wish Like',
+                'unique_together': {('wish', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0 on 2026-10-17 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('wishes', '0014_wishlike'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outbox',
+            name='wishes_outb_next_at_1d1805_idx',
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='outbox',
+            index=models.Index(
+                condition=models.Q(('failed_at__isnull', True)),
+                fields=['next_attempt_at'],
+                name='outbox_due_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+import copy
+
+from django.db.models.fields.files import FieldFile
+
+
+def _comparable(value):
+    """A detached copy of a field value that can be compared later"""
+    if isinstance(value, FieldFile):
+        return value.name
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+class DirtyFieldsMixin:
+    """
+    Track which concrete fields changed since the instance was loaded or saved.
+
+    save() on an existing row writes only the changed fields (plus auto_now
+    timestamps) and skips the UPDATE entirely when nothing changed. Explicit
+    update_fields are passed through untouched.
+    """
+
+    # Fields save() never writes on its own, e.g. columns owned by write-behind buffers
+    DIRTY_EXCLUDE = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def _snapshot_fields(self, attnames=None):
+        snapshot = self.__dict__.setdefault('_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__ and (attnames is None or field.attname in attnames):
+                snapshot[field.attname] = _comparable(self.__dict__[field.attname])
+
+    def get_dirty_fields(self):
+        """Names of the concrete fields that differ from the last load or save"""
+        snapshot = self.__dict__.get('_loaded_values', {})
+        dirty = set()
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if field.attname not in snapshot or snapshot[field.attname] != _comparable(self.__dict__[field.attname]):
+                dirty.add(field.name)
+        return dirty
+
+    def is_dirty(self):
+        return bool(self.get_dirty_fields() - set(self.DIRTY_EXCLUDE))
+
+    def save(self, *args, **kwargs):
+        tracked = '_loaded_values' in self.__dict__
+        if tracked and not self._state.adding and not args and not kwargs.get('force_insert') \
+                and kwargs.get('update_fields') is None:
+            dirty = self.get_dirty_fields() - set(self.DIRTY_EXCLUDE)
+            if not dirty:
+                return
+            dirty.update(
+                field.name for field in self._meta.concrete_fields if getattr(field, 'auto_now', False)
+            )
+            kwargs['update_fields'] = dirty
+
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._snapshot_fields()
+        else:
+            self._snapshot_fields({self._meta.get_field(name).attname for name in update_fields})
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        fields = kwargs.get('fields')
+        self._snapshot_fields(
+            None if fields is None else {self._meta.get_field(name).attname for name in fields}
+        )
@@ -1,45 +1,28 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import datetime, timedelta
 import uuid
 
+from .birthdays import birthday_facts, birthday_ordinal, utc_offset_bucket
+from .mixins import DirtyFieldsMixin
+from .managers import (
+    BirthdayManager, OutboxManager, SiteWishStatManager, UpcomingBirthdayManager, UserSearchTermManager,
+    UserWishStatsManager, WishManager, WishStatsKey, record_wish_changes
+)
 
-class BirthdayManager(models.Manager):
-    """Custom manager for birthday-related queries"""
 
-    def get_upcoming_birthdays(self, days=30):
-        """Get birthdays within the next 'days' days"""
-        today = timezone.now().date()
-        upcoming = []
-
-        profiles = self.all()
-        for profile in profiles:
-            if profile.birthday:
-                next_birthday = profile.get_next_birthday()
-                if next_birthday and (next_birthday - today).days <= days:
-                    upcoming.append(profile)
-
-        return sorted(upcoming, key=lambda x: x.get_next_birthday())
-
-    def get_today_birthdays(self):
-        """Get all birthdays that occur today"""
-        today = timezone.now().date()
-        return self.filter(
-            birthday__month=today.month,
-            birthday__day=today.day
-        )
-
-
-class UserProfile(models.Model):
+class UserProfile(DirtyFieldsMixin, models.Model):
     """Extended user profile with birthday information"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
-    birthday = models.DateField(null=True, blank=True)
+    birthday = models.DateField(null=True, blank=True, db_index=True)
+    birthday_ordinal = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, db_index=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True)
     phone_number = models.CharField(max_length=15, blank=True)
     bio = models.TextField(max_length=500, blank=True)
     notification_preferences = models.JSONField(default=dict)
     timezone = models.CharField(max_length=50, default='UTC')
+    utc_offset_bucket = models.SmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -49,38 +32,102 @@ class UserProfile(models.Model):
         ordering = ['user__username']
         verbose_name = 'User Profile'
         verbose_name_plural = 'User Profiles'
+        indexes = [
+            models.Index(fields=['utc_offset_bucket', 'birthday_ordinal']),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+    def save(self, *args, **kwargs):
+        """Keep the indexed birthday ordinal and offset bucket in sync"""
+        self.birthday_ordinal = birthday_ordinal(self.birthday)
+        self.utc_offset_bucket = utc_offset_bucket(self.timezone)
+        self.__dict__.pop('_birthday_facts', None)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'birthday' in update_fields:
+                update_fields.add('birthday_ordinal')
+            if 'timezone' in update_fields:
+                update_fields.add('utc_offset_bucket')
+            kwargs['update_fields'] = update_fields
+
+        super().save(*args, **kwargs)
+
+    def get_birthday_facts(self):
+        """Next birthday, days until it and age (precomputed when batched)"""
+        if '_birthday_facts' in self.__dict__:
+            return self._birthday_facts
+        return birthday_facts([self.birthday])[0]
+
     def get_next_birthday(self):
         """Calculate the next birthday date"""
-        if not self.birthday:
-            return None
+        facts = self.get_birthday_facts()
+        return facts.next_birthday if facts else None
 
-        today = timezone.now().date()
-        next_birthday = self.birthday.replace(year=today.year)
+    def get_age(self):
+        """Calculate current age"""
+        facts = self.get_birthday_facts()
+        return facts.age if facts else None
 
-        if next_birthday < today:
-            next_birthday = next_birthday.replace(year=today.year + 1)
 
-        return next_birthday
+class UserSearchTerm(models.Model):
+    """Lowercased name of a user, indexed for prefix autocomplete"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=150)
 
-    def get_age(self):
-        """Calculate current age"""
-        if not self.birthday:
-            return None
+    objects = UserSearchTermManager()
 
-        today = timezone.now().date()
-        age = today.year - self.birthday.year
+    class Meta:
+        # Also the (term, user) index that serves ordered prefix scans
+        unique_together = ['term', 'user']
+
+    def __str__(self):
+        return self.term
 
-        if (today.month, today.day) < (self.birthday.month, self.birthday.day):
-            age -= 1
 
-        return age
+class UpcomingBirthday(models.Model):
+    """Materialized next occurrence of each profile's birthday"""
+    profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='upcoming_birthday')
+    next_date = models.DateField(db_index=True)
+    days_until = models.PositiveSmallIntegerField()  # as of refreshed_on
+    age_turning = models.SmallIntegerField()
+    refreshed_on = models.DateField()
 
+    objects = UpcomingBirthdayManager()
 
-class BirthdayWish(models.Model):
+    class Meta:
+        ordering = ['next_date']
+        verbose_name = 'Upcoming Birthday'
+        verbose_name_plural = 'Upcoming Birthdays'
+
+    def __str__(self):
+        return f"{self.profile.user.username} on {self.next_date}"
+
+
+class Contact(models.Model):
+    """Directed contact relation: 'owner' follows the birthdays of 'contact'"""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='contacts')
+    contact = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['owner', 'contact']
+        ordering = ['-created_at']
+        verbose_name = 'Contact'
+        verbose_name_plural = 'Contacts'
+        indexes = [
+            models.Index(fields=['contact', 'owner']),
+        ]
+
+    def __str__(self):
+        return f"{self.owner.username} follows {self.contact.username}"
+
+
+class BirthdayWish(DirtyFieldsMixin, models.Model):
     """Main wish model with various types of wishes"""
 
     WISH_TYPE_CHOICES = [
@@ -119,10 +166,13 @@ class BirthdayWish(models.Model):
     is_anonymous = models.BooleanField(default=False)
     likes_count = models.IntegerField(default=0)
     views_count = models.IntegerField(default=0)
+    viewer_sketch = models.BinaryField(null=True, editable=False)  # HyperLogLog of unique viewers
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = WishManager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Birthday Wish'
@@ -130,19 +180,138 @@ class BirthdayWish(models.Model):
         indexes = [
             models.Index(fields=['recipient', 'status']),
             models.Index(fields=['scheduled_date']),
+            models.Index(fields=['status', 'scheduled_date']),  # Due-wish dispatcher
         ]
 
     def __str__(self):
         return f"Wish from {self.sender.username} to {self.recipient.username}"
 
-    def mark_as_sent(self):
-        """Mark wish as sent"""
-        self.status = 'sent'
-        self.sent_date = timezone.now()
-        self.save()
+    STATS_FIELDS = WishStatsKey._fields
+    # Only ever written by the write-behind flushes in wishes.counters
+    DIRTY_EXCLUDE = ('views_count', 'likes_count', 'viewer_sketch')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the counters currently reflect for this row
+        loaded = instance.__dict__
+        if all(field in loaded for field in cls.STATS_FIELDS):
+            instance._stats_key = WishStatsKey._make(loaded[field] for field in cls.STATS_FIELDS)
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save and adjust the wish counters in the same transaction"""
+        update_fields = kwargs.get('update_fields')
+        old_key = getattr(self, '_stats_key', None)
+        adding = self._state.adding
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            if old_key is None and not adding:
+                # Loaded with deferred fields; leave it to rebuild_wish_stats
+                return
+
+            new_key = WishStatsKey._make(getattr(self, field) for field in self.STATS_FIELDS)
+            if update_fields is not None and old_key is not None:
+                # Only the saved columns changed in the database
+                saved = {self._meta.get_field(name).attname for name in update_fields}
+                new_key = old_key._replace(**{
+                    field: getattr(new_key, field) for field in self.STATS_FIELDS if field in saved
+                })
+
+            if new_key != old_key:
+                record_wish_changes([(old_key, new_key)])
+            self._stats_key = new_key
+
+    def mark_as_sent(self, expected=None):
+        """
+        Mark wish as sent and queue its notification, unless another caller got there first.
+
+        One conditional UPDATE, so no read-modify-write; returns whether this call won.
+        """
+        won = bool(BirthdayWish.objects.filter(pk=self.pk).mark_as_sent(expected=expected))
+
+        self.refresh_from_db(fields=['status', 'sent_date', 'updated_at'])
+        if getattr(self, '_stats_key', None) is not None:
+            # The counters were moved by the transition, not by save()
+            self._stats_key = self._stats_key._replace(status=self.status, sent_date=self.sent_date)
+        return won
+
+
+class WishLike(models.Model):
+    """One user's like of a wish; likes_count only counts the first"""
+    wish = models.ForeignKey(BirthdayWish, on_delete=models.CASCADE, related_name='likes')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wish_likes')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['wish', 'user']
+        verbose_name = 'Wish Like'
+
+    def __str__(self):
+        return f"{self.user.username} likes wish {self.wish_id}"
+
+
+class Outbox(models.Model):
+    """Wish notifications waiting for delivery, written with the status change that sends them"""
+    wish = models.ForeignKey(BirthdayWish, on_delete=models.CASCADE, related_name='outbox_entries')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set once attempts run out; the wish itself stays sent
+    failed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = OutboxManager()
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        verbose_name = 'Outbox Entry'
+        verbose_name_plural = 'Outbox'
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=models.Q(failed_at__isnull=True), name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification for wish {self.wish_id} (attempt {self.attempts})"
+
+
+class UserWishStats(models.Model):
+    """Denormalized per-user wish counters, kept in step with BirthdayWish"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='wish_stats')
+    sent_count = models.PositiveIntegerField(default=0)
+    received_count = models.PositiveIntegerField(default=0)
+    scheduled_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserWishStatsManager()
+
+    class Meta:
+        verbose_name = 'User Wish Stats'
+        verbose_name_plural = 'User Wish Stats'
+
+    def __str__(self):
+        return f"Wish stats for {self.user.username}"
+
+
+class SiteWishStat(models.Model):
+    """Site-wide sent wishes per day and wish type, kept in step with BirthdayWish"""
+    day = models.DateField()
+    wish_type = models.CharField(max_length=10, choices=BirthdayWish.WISH_TYPE_CHOICES)
+    sent_count = models.IntegerField(default=0)
+
+    objects = SiteWishStatManager()
+
+    class Meta:
+        ordering = ['-day', 'wish_type']
+        unique_together = ['day', 'wish_type']
+        verbose_name = 'Site Wish Stat'
+
+    def __str__(self):
+        return f"{self.sent_count} {self.wish_type} wishes sent on {self.day}"
 
 
-class GroupWish(models.Model):
+class GroupWish(DirtyFieldsMixin, models.Model):
     """Group wishes where multiple people contribute"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=200)
@@ -183,7 +352,7 @@ class GroupWish(models.Model):
         self.save()
 
 
-class GroupWishContribution(models.Model):
+class GroupWishContribution(DirtyFieldsMixin, models.Model):
     """Individual contributions to group wishes"""
     group_wish = models.ForeignKey(GroupWish, on_delete=models.CASCADE, related_name='contributions')
     contributor = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -202,7 +371,7 @@ class GroupWishContribution(models.Model):
         return f"{self.contributor.username}'s contribution to {self.group_wish.title}"
 
 
-class GiftSuggestion(models.Model):
+class GiftSuggestion(DirtyFieldsMixin, models.Model):
     """Gift suggestions and recommendations"""
 
     CATEGORY_CHOICES = [
@@ -244,7 +413,7 @@ class GiftSuggestion(models.Model):
         return self.title
 
 
-class CalendarEvent(models.Model):
+class CalendarEvent(DirtyFieldsMixin, models.Model):
     """Birthday calendar events"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_events')
     birthday_person = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
@@ -286,7 +455,7 @@ class ChatMessage(models.Model):
         return f"Chat with {self.user.username} at {self.timestamp}"
 
 
-class WishTemplate(models.Model):
+class WishTemplate(DirtyFieldsMixin, models.Model):
     """Pre-made wish templates"""
 
     OCCASION_CHOICES = [
@@ -0,0 +1,176 @@
+import math
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+PREFIX = 'ratelimit'
+REGISTRY_KEY = f'{PREFIX}:buckets'
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every process through the cache.
+
+    Holds up to 'burst' tokens and refills at 'rate' tokens per second.
+    State is a (tokens, timestamp) pair updated under a short cache lock.
+    """
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.key = f'{PREFIX}:{name}'
+        self.lock_key = f'{self.key}:lock'
+        # Long enough to refill from empty; a missing bucket is a full one
+        self.timeout = int(self.burst / self.rate) + 60
+
+    def _level(self, state, now):
+        if state is None:
+            return self.burst
+        tokens, stamp = state
+        return min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+
+    def _lock(self):
+        # Held for a get and a set; a few short retries cover contention
+        for _ in range(50):
+            if cache.add(self.lock_key, 1, 5):
+                return True
+            time.sleep(0.001)
+        return False
+
+    def take(self, wanted, now=None):
+        """Take up to 'wanted' tokens; returns (granted, seconds until the next token)"""
+        now = time.time() if now is None else now
+        if not self._lock():
+            return 0, 1 / self.rate
+
+        try:
+            state = cache.get(self.key)
+            if state is None:
+                register(self.name)
+            level = self._level(state, now)
+            granted = min(wanted, int(level))
+            level -= granted
+            cache.set(self.key, (level, now), self.timeout)
+        finally:
+            cache.delete(self.lock_key)
+
+        # Short only when under one token is left, so the wait is for the rest of it
+        return granted, (1 - level) / self.rate if granted < wanted else 0.0
+
+    def refund(self, tokens, now=None):
+        """Give back tokens taken for items that were not sent after all"""
+        now = time.time() if now is None else now
+        if tokens <= 0 or not self._lock():
+            return
+        try:
+            level = self._level(cache.get(self.key), now)
+            cache.set(self.key, (min(self.burst, level + tokens), now), self.timeout)
+        finally:
+            cache.delete(self.lock_key)
+
+    def state(self, now=None):
+        """Current fill level without taking anything"""
+        now = time.time() if now is None else now
+        return {
+            'tokens': round(self._level(cache.get(self.key), now), 2),
+            'rate': self.rate,
+            'burst': self.burst,
+        }
+
+
+def register(name):
+    """Remember a bucket name for the health endpoint (best effort, not atomic)"""
+    names = cache.get(REGISTRY_KEY, set())
+    if name not in names:
+        cache.set(REGISTRY_KEY, names | {name}, None)
+
+
+def get_bucket(channel, destination=None):
+    """The bucket for a channel, or for one destination on it; None when unlimited"""
+    limits = settings.NOTIFICATION_RATE_LIMITS.get(channel)
+    if not limits:
+        return None
+    if destination is None:
+        limit = limits.get('total')
+        name = channel
+    else:
+        domains = limits.get('domains', {})
+        limit = domains.get(destination, domains.get('*'))
+        name = f'{channel}:{destination}'
+    if not limit:
+        return None
+    return TokenBucket(name, limit['rate'], limit['burst'])
+
+
+def email_domain(address):
+    """Lowercased domain of an email address, or None without one"""
+    if not address or '@' not in address:
+        return None
+    return address.rsplit('@', 1)[1].lower()
+
+
+def admit(channel, items, destination, now=None):
+    """
+    Split items into (allowed, waiting) under the channel's limits.
+
+    destination(item) names the per-destination bucket; items without one
+    are only held to the channel total. waiting holds (item, delay) pairs,
+    spaced one refill interval apart so requeued items come back in order
+    rather than all at once.
+    """
+    from .checks import check_rate_limit_cache
+
+    # Workers skip system checks, so refuse here too rather than limit per process
+    errors = check_rate_limit_cache(None)
+    if errors:
+        raise ImproperlyConfigured(errors[0].msg)
+
+    now = time.time() if now is None else now
+    total = get_bucket(channel)
+    groups = defaultdict(list)
+    for item in items:
+        groups[destination(item)].append(item)
+
+    allowed, waiting = [], []
+    for name, group in groups.items():
+        bucket = get_bucket(channel, name) if name is not None else None
+        granted, wait = bucket.take(len(group), now) if bucket else (len(group), 0.0)
+        limiting = bucket
+
+        if total is not None and granted:
+            got, total_wait = total.take(granted, now)
+            if got < granted:
+                if bucket:
+                    bucket.refund(granted - got, now)
+                granted, wait, limiting = got, max(wait, total_wait), total
+
+        allowed.extend(group[:granted])
+        waiting.extend(
+            (item, wait + i / limiting.rate) for i, item in enumerate(group[granted:])
+        )
+
+    return allowed, waiting
+
+
+def delay_groups(waiting):
+    """Group (item, delay) pairs by whole seconds of delay, for one requeue per group"""
+    groups = defaultdict(list)
+    for item, delay in waiting:
+        groups[max(1, math.ceil(delay))].append(item)
+    return groups
+
+
+def snapshot(now=None):
+    """State of every bucket used so far, for the health endpoint"""
+    now = time.time() if now is None else now
+    buckets = {}
+    for name in sorted(cache.get(REGISTRY_KEY, set())):
+        channel, _, destination = name.partition(':')
+        bucket = get_bucket(channel, destination or None)
+        if bucket is not None:
+            buckets[name] = bucket.state(now)
+    return buckets
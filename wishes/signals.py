@@ -1,7 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .birthday_index import bump_version
+from .fragments import GROUPS, WISHES, bump_fragment_version
+from .ics import bump_feed_version
+from .models import (
+    BirthdayWish, CalendarEvent, Contact, GroupWish, GroupWishContribution,
+    UpcomingBirthday, UserProfile, UserSearchTerm, WishTemplate
+)
+from .managers import record_wish_changes
+from . import template_catalog
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -11,6 +19,105 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    """Save the UserProfile when the User is saved"""
-    if hasattr(instance, 'profile'):
+    """Save the UserProfile along with the User if it was loaded (and so maybe edited) through it"""
+    if User.profile.is_cached(instance):
+        # Writes only changed columns, and nothing at all if the profile is untouched
         instance.profile.save()
+
+@receiver(post_save, sender=User)
+def sync_user_search_terms(sender, instance, update_fields=None, **kwargs):
+    """Keep the autocomplete terms in step with the user's names"""
+    if update_fields is None or {'username', 'first_name', 'last_name'} & set(update_fields):
+        UserSearchTerm.objects.sync_user(instance)
+
+@receiver(post_save, sender=User)
+def refresh_follower_feeds_for_user(sender, instance, created, update_fields=None, **kwargs):
+    """Names appear in the feeds of everyone following the user"""
+    if created:
+        return
+    if update_fields is None or {'username', 'first_name', 'last_name'} & set(update_fields):
+        followers = Contact.objects.filter(contact_id=instance.pk).values_list('owner_id', flat=True)
+        bump_feed_version([instance.pk, *followers])
+
+@receiver(post_save, sender=UserProfile)
+def refresh_birthday_index(sender, instance, created, update_fields=None, **kwargs):
+    """Invalidate the in-process birthday index when a birthday may have changed"""
+    if created:
+        # New registrations have no birthday yet; don't make every process rebuild for them
+        changed = instance.birthday is not None
+    else:
+        changed = update_fields is None or {'birthday', 'birthday_ordinal'} & set(update_fields)
+    if changed:
+        bump_version()
+
+@receiver(post_save, sender=UserProfile)
+def sync_upcoming_birthday(sender, instance, update_fields=None, **kwargs):
+    """Keep the profile's materialized upcoming birthday row current"""
+    if update_fields is None or 'birthday' in update_fields:
+        UpcomingBirthday.objects.sync_profile(instance)
+
+@receiver(post_delete, sender=UserProfile)
+def drop_from_birthday_index(sender, instance, **kwargs):
+    """Invalidate the in-process birthday index when a profile is removed"""
+    bump_version()
+
+@receiver(post_save, sender=UserProfile)
+def refresh_follower_feeds(sender, instance, **kwargs):
+    """A profile change shows up in the feeds of everyone following it, and its own"""
+    followers = Contact.objects.filter(contact_id=instance.user_id).values_list('owner_id', flat=True)
+    bump_feed_version([instance.user_id, *followers])
+
+@receiver(post_save, sender=Contact)
+@receiver(post_delete, sender=Contact)
+def refresh_owner_feed_contacts(sender, instance, **kwargs):
+    """Adding or removing a contact changes the owner's calendar feed"""
+    bump_feed_version([instance.owner_id])
+
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+def refresh_owner_feed_events(sender, instance, **kwargs):
+    """Calendar events are part of their owner's calendar feed"""
+    bump_feed_version([instance.user_id])
+
+@receiver(post_delete, sender=BirthdayWish)
+def uncount_deleted_wish(sender, instance, **kwargs):
+    """Remove a deleted wish from the wish counters (runs inside the delete transaction)"""
+    key = getattr(instance, '_stats_key', None)
+    if key is not None:
+        record_wish_changes([(key, None)])
+
+@receiver(post_save, sender=BirthdayWish)
+@receiver(post_delete, sender=BirthdayWish)
+def refresh_wish_fragments(sender, instance, **kwargs):
+    """A wish appears on both its sender's and its recipient's dashboard"""
+    bump_fragment_version(WISHES, [instance.sender_id, instance.recipient_id])
+
+def _group_members(group_wish_id):
+    return GroupWishContribution.objects.filter(group_wish_id=group_wish_id).values_list('contributor_id', flat=True)
+
+@receiver(post_save, sender=GroupWish)
+@receiver(post_delete, sender=GroupWish)
+def refresh_group_fragments(sender, instance, **kwargs):
+    """A group wish is listed on the dashboard of every contributor"""
+    bump_fragment_version(GROUPS, [instance.creator_id, *_group_members(instance.pk)])
+
+@receiver(post_save, sender=GroupWishContribution)
+@receiver(post_delete, sender=GroupWishContribution)
+def refresh_contribution_fragments(sender, instance, **kwargs):
+    """A contribution changes the group's contributor count for everyone in it"""
+    bump_fragment_version(GROUPS, [instance.contributor_id, *_group_members(instance.group_wish_id)])
+
+@receiver(m2m_changed, sender=GroupWish.contributors.through)
+def refresh_contributor_fragments(sender, instance, action, pk_set, **kwargs):
+    """contributors.add() and friends bypass the contribution's own signals"""
+    if action in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        if isinstance(instance, GroupWish):
+            bump_fragment_version(GROUPS, [*(pk_set or ()), *_group_members(instance.pk)])
+        else:
+            bump_fragment_version(GROUPS, [instance.pk])
+
+@receiver(post_save, sender=WishTemplate)
+@receiver(post_delete, sender=WishTemplate)
+def refresh_template_catalog(sender, instance, **kwargs):
+    """Invalidate the in-process template catalog in every process"""
+    template_catalog.bump_version()
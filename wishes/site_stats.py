@@ -0,0 +1,55 @@
+from django.core.cache import cache
+
+SENT_KEY = 'site_stats:sent:{wish_type}'
+
+
+def _wish_types():
+    from .models import BirthdayWish
+
+    return [wish_type for wish_type, _ in BirthdayWish.WISH_TYPE_CHOICES]
+
+
+def get_sent_counts():
+    """
+    Sent wishes per wish type, read from the cache.
+
+    Missing keys are filled from the SiteWishStat table, which holds one
+    row per day and type, so the fallback never scans BirthdayWish.
+    """
+    from .models import SiteWishStat
+
+    keys = {wish_type: SENT_KEY.format(wish_type=wish_type) for wish_type in _wish_types()}
+    cached = cache.get_many(keys.values())
+    if len(cached) == len(keys):
+        return {wish_type: cached[key] for wish_type, key in keys.items()}
+
+    totals = SiteWishStat.objects.totals()
+    counts = {wish_type: totals.get(wish_type, 0) for wish_type in keys}
+    cache.set_many({keys[wish_type]: count for wish_type, count in counts.items()}, None)
+    return counts
+
+
+def total_wishes_sent():
+    """Total sent wishes across the site"""
+    return sum(get_sent_counts().values())
+
+
+def apply_deltas(deltas):
+    """Adjust the cached per-type totals after a committed change"""
+    for wish_type, delta in deltas.items():
+        try:
+            cache.incr(SENT_KEY.format(wish_type=wish_type), delta)
+        except ValueError:
+            # Not cached yet; the next read loads it from the database
+            pass
+
+
+def sync():
+    """Overwrite the cached totals with the database's"""
+    from .models import SiteWishStat
+
+    totals = SiteWishStat.objects.totals()
+    cache.set_many({
+        SENT_KEY.format(wish_type=wish_type): totals.get(wish_type, 0)
+        for wish_type in _wish_types()
+    }, None)
@@ -0,0 +1,155 @@
+import random
+import threading
+
+from .template_catalog import get_template_catalog
+
+# Served only while no WishTemplate exists yet
+DEFAULT_SUGGESTIONS = {
+    'heartfelt': (
+        "Wishing you a day filled with love, laughter, and all the happiness your heart can hold. Happy Birthday!",
+        "May this special day bring you endless joy and tons of precious memories. Have a wonderful birthday!",
+        "Here's to another year of wonderful memories and countless blessings. Happy Birthday!",
+    ),
+    'funny': (
+        "Congratulations on being born a really long time ago! 🎉",
+        "You're not getting older, you're just becoming a classic! Happy Birthday! 🎂",
+        "Age is just a number... and in your case, a really big one! 😄 Happy Birthday!",
+    ),
+    'professional': (
+        "Wishing you continued success and happiness on your special day. Happy Birthday!",
+        "May this year bring you professional growth and personal fulfillment. Best wishes on your birthday!",
+        "Happy Birthday! May your day be filled with joy and your year with prosperity.",
+    ),
+    'creative': (
+        "Another 365 days of awesomeness completed! 🌟 Level up! Happy Birthday!",
+        "Today is the anniversary of your legendary arrival on Earth! 🚀 Happy Birthday!",
+        "The world became a better place the day you were born. Keep shining! ✨ Happy Birthday!",
+    ),
+}
+
+_engine = None
+_lock = threading.Lock()
+
+
+class AliasTable:
+    """
+    Walker/Vose alias table: O(n) to build, O(1) per weighted draw.
+    """
+
+    __slots__ = ('prob', 'alias')
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [weight * n / total for weight in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, rng=random):
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class Pool:
+    """Templates of one (occasion, category) pair, most used first, with their alias table"""
+
+    __slots__ = ('signature', 'templates', 'table')
+
+    def __init__(self, signature, templates):
+        self.signature = signature
+        self.templates = tuple(templates)
+        # +1 so templates nobody has used yet still get picked now and then
+        self.table = AliasTable([template.usage_count + 1 for template in self.templates])
+
+    def top(self, k):
+        return self.templates[:k]
+
+    def sample(self, k, rng=random):
+        """Up to k distinct templates drawn by usage weight"""
+        k = min(k, len(self.templates))
+        picked = []
+        seen = set()
+        # Rejection keeps each draw O(1); a few rounds per pick is plenty
+        for _ in range(8 * k):
+            if len(picked) == k:
+                break
+            i = self.table.sample(rng)
+            if i not in seen:
+                seen.add(i)
+                picked.append(self.templates[i])
+        for template in self.templates:
+            if len(picked) == k:
+                break
+            if template not in picked:
+                picked.append(template)
+        return picked
+
+
+class SuggestionEngine:
+    """
+    Weighted wish suggestions per (occasion, category), built from the template catalog.
+
+    Pools exist for each exact pair plus every occasion and every category on
+    its own. When the catalog version moves only pools whose templates or
+    usage counts changed get a new alias table.
+    """
+
+    __slots__ = ('version', 'pools')
+
+    def __init__(self, catalog, previous=None):
+        self.version = catalog.version
+        grouped = {}
+        for template in catalog.templates:
+            category = template.category.lower()
+            for key in ((template.occasion, category), (template.occasion, None), (None, category), (None, None)):
+                grouped.setdefault(key, []).append(template)
+
+        old_pools = previous.pools if previous is not None else {}
+        self.pools = {}
+        for key, templates in grouped.items():
+            signature = tuple((t.pk, t.usage_count, t.content) for t in templates)
+            old = old_pools.get(key)
+            self.pools[key] = old if old is not None and old.signature == signature else Pool(signature, templates)
+
+    def pool(self, occasion=None, category=None):
+        """The most specific non-empty pool for the request"""
+        category = category.lower() if category else None
+        for key in ((occasion, category), (None, category), (occasion, None), (None, None)):
+            if key in self.pools:
+                return self.pools[key]
+        return None
+
+    def suggest(self, occasion=None, category=None, limit=3, weighted=True, rng=random):
+        """Suggested wish texts: a weighted random draw, or the most used when not weighted"""
+        pool = self.pool(occasion, category)
+        if pool is None:
+            return list(DEFAULT_SUGGESTIONS.get(category, DEFAULT_SUGGESTIONS['heartfelt'])[:limit])
+        templates = pool.sample(limit, rng) if weighted else pool.top(limit)
+        return [template.content for template in templates]
+
+
+def get_suggestion_engine():
+    """Return this process's engine, rebuilding stale pools if the catalog moved"""
+    global _engine
+
+    catalog = get_template_catalog()
+    engine = _engine
+    if engine is not None and engine.version == catalog.version:
+        return engine
+
+    with _lock:
+        if _engine is None or _engine.version != catalog.version:
+            _engine = SuggestionEngine(catalog, previous=_engine)
+        return _engine
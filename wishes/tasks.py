@@ -1,50 +1,146 @@
+from datetime import timedelta
+
 from celery import shared_task
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
 from django.conf import settings
-from .models import BirthdayWish, UserProfile, CalendarEvent
-from .utils import send_birthday_notification
+from . import ratelimit
+from .birthdays import midnight_buckets, ordinal_ranges, utc_offset_bucket
+from .models import BirthdayWish, UserProfile, CalendarEvent, Contact, Outbox, UpcomingBirthday
+from .utils import send_birthday_notifications, send_bulk_mail
 
 
 @shared_task
 def send_scheduled_wish(wish_id):
-    """Send a scheduled birthday wish"""
-    try:
-        wish = BirthdayWish.objects.get(id=wish_id)
-
-        if wish.status == 'scheduled':
-            wish.mark_as_sent()
-            send_birthday_notification(wish)
-            return f"Wish {wish_id} sent successfully"
+    """Send a scheduled birthday wish (drains ETA tasks queued before dispatch_due_wishes)"""
+    if not BirthdayWish.objects.filter(id=wish_id).exists():
+        return f"Wish {wish_id} not found"
 
+    # Compare-and-set, so a redelivered task or the dispatcher cannot send it twice
+    if not BirthdayWish.objects.filter(id=wish_id).mark_as_sent(expected='scheduled'):
         return f"Wish {wish_id} already sent"
+    return f"Wish {wish_id} queued for delivery"
 
-    except BirthdayWish.DoesNotExist:
-        return f"Wish {wish_id} not found"
+
+@shared_task
+def dispatch_due_wishes(batch_size=None, max_batches=10):
+    """
+    Claim due scheduled wishes in batches and queue their notifications.
+
+    Runs every few seconds; add workers to raise throughput, since each
+    batch is claimed with SKIP LOCKED. max_batches bounds a single run.
+    """
+    batch_size = batch_size or settings.WISH_DISPATCH_BATCH_SIZE
+    claimed = 0
+
+    for _ in range(max_batches):
+        won = BirthdayWish.objects.claim_pending_wishes(batch_size)
+        claimed += len(won)
+        if len(won) < batch_size:
+            break
+
+    return f"Dispatched {claimed} due wishes"
 
 
 @shared_task
-def check_birthdays_today():
-    """Check for birthdays today and send notifications"""
-    today = timezone.now().date()
-    profiles = UserProfile.objects.filter(
-        birthday__month=today.month,
-        birthday__day=today.day
-    )
+def drain_outbox(batch_size=None, max_batches=10):
+    """
+    Deliver queued wish notifications in batches over pooled connections.
+
+    Runs every few seconds on as many workers as needed; failed sends are
+    retried with exponential backoff until OUTBOX_MAX_ATTEMPTS, then kept with
+    failed_at set. Entries over the email rate limits wait in the outbox
+    instead of in the worker.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    delivered = retried = failed = limited = 0
+
+    for _ in range(max_batches):
+        entries = Outbox.objects.claim(batch_size)
+        if not entries:
+            break
+
+        # No email address means nothing to send, not a failed delivery
+        unreachable = [entry.pk for entry in entries if not entry.wish.recipient.email]
+        if unreachable:
+            Outbox.objects.filter(pk__in=unreachable).delete()
+        sendable = [entry for entry in entries if entry.wish.recipient.email]
+
+        allowed, waiting = ratelimit.admit(
+            'email', sendable, lambda entry: ratelimit.email_domain(entry.wish.recipient.email)
+        )
+        limited += Outbox.objects.defer(ratelimit.delay_groups(waiting))
+
+        results = send_birthday_notifications([entry.wish for entry in allowed])
+        counts = Outbox.objects.settle(
+            allowed, results, settings.OUTBOX_MAX_ATTEMPTS, settings.OUTBOX_RETRY_DELAY
+        )
+        delivered += counts[0]
+        retried += counts[1]
+        failed += counts[2]
+        if len(entries) < batch_size:
+            break
+
+    return f"Delivered {delivered} notifications, {retried} to retry, {failed} failed, {limited} rate limited"
+
 
+@shared_task
+def check_birthdays_today():
+    """
+    Check for birthdays in the time zones whose day just started.
+
+    Runs hourly; each run only looks at the UTC-offset buckets where local
+    midnight has just passed, using that bucket's local date.
+    """
+    now = timezone.now()
+    birthdays = 0
     notifications_sent = 0
 
-    for profile in profiles:
-        # Send birthday notification
-        subject = f"🎉 It's {profile.user.get_full_name()}'s Birthday Today!"
-        message = f"Don't forget to wish {profile.user.get_full_name()} a happy birthday!"
+    for bucket in midnight_buckets(now.hour):
+        local_date = (now + timedelta(hours=bucket)).date()
+        low, high = ordinal_ranges(local_date, 0)[0]
+
+        profiles = UserProfile.objects.filter(
+            utc_offset_bucket=bucket,
+            birthday_ordinal__range=(low, high)
+        ).select_related('user')
+
+        birthday_users = {profile.user_id: profile.user for profile in profiles}
+        if not birthday_users:
+            continue
+
+        # Notify everyone who follows today's birthday people
+        followers = Contact.objects.filter(
+            contact_id__in=birthday_users
+        ).select_related('owner')
+
+        for contact in followers:
+            birthday_user = birthday_users[contact.contact_id]
+            subject = f"🎉 It's {birthday_user.get_full_name()}'s Birthday Today!"
+            message = f"Don't forget to wish {birthday_user.get_full_name()} a happy birthday!"
+
+            # For now, we'll just log it
+            print(f"Birthday today: {birthday_user.username} (notifying {contact.owner.username})")
+            notifications_sent += 1
 
-        # Get all users who might want to send wishes (friends, followers, etc.)
-        # For now, we'll just log it
-        print(f"Birthday today: {profile.user.username}")
-        notifications_sent += 1
+        birthdays += len(birthday_users)
 
-    return f"Processed {notifications_sent} birthdays"
+    return f"Processed {birthdays} birthdays, {notifications_sent} notifications"
+
+
+@shared_task
+def refresh_timezone_buckets():
+    """Recompute UTC-offset buckets so daylight saving changes are picked up"""
+    updated = 0
+    time_zones = UserProfile.objects.values_list('timezone', flat=True).distinct()
+
+    for tz_name in time_zones:
+        bucket = utc_offset_bucket(tz_name)
+        updated += UserProfile.objects.filter(timezone=tz_name).exclude(
+            utc_offset_bucket=bucket
+        ).update(utc_offset_bucket=bucket)
+
+    return f"Moved {updated} profiles to a new offset bucket"
 
 
 @shared_task
@@ -52,16 +148,79 @@ def send_birthday_reminders():
     """Send reminders for upcoming birthdays"""
     tomorrow = timezone.now().date() + timezone.timedelta(days=1)
 
-    profiles = UserProfile.objects.filter(
-        birthday__month=tomorrow.month,
-        birthday__day=tomorrow.day
-    )
+    upcoming = UpcomingBirthday.objects.filter(next_date=tomorrow).values_list('profile__user_id', flat=True)
+    birthday_user_ids = set(upcoming)
+
+    # Remind everyone who follows tomorrow's birthday people, in one pooled send
+    contact_ids = list(Contact.objects.filter(
+        contact_id__in=birthday_user_ids
+    ).exclude(owner__email='').values_list('pk', flat=True))
+
+    return f"Sent reminders for {len(birthday_user_ids)} birthdays, {send_reminder_emails(contact_ids)}"
+
+
+@shared_task
+def send_reminder_emails(contact_ids):
+    """Email followers about a birthday tomorrow, requeueing those over the rate limits"""
+    contacts = Contact.objects.filter(pk__in=contact_ids).select_related('owner', 'contact')
+
+    allowed, waiting = ratelimit.admit('email', contacts, lambda contact: ratelimit.email_domain(contact.owner.email))
+    for delay, group in ratelimit.delay_groups(waiting).items():
+        send_reminder_emails.apply_async(args=[[contact.pk for contact in group]], countdown=delay)
+
+    messages = []
+    for contact in allowed:
+        name = contact.contact.get_full_name() or contact.contact.username
+        messages.append((contact.pk, EmailMessage(
+            f"🎂 {name}'s Birthday is Tomorrow!",
+            f"Don't forget to wish {name} a happy birthday tomorrow!",
+            settings.DEFAULT_FROM_EMAIL,
+            [contact.owner.email],
+        )))
+
+    results = send_bulk_mail(messages)
+
+    return f"{sum(results.values())} of {len(results)} emails delivered, {len(waiting)} rate limited"
+
+
+@shared_task
+def refresh_upcoming_birthdays():
+    """Roll the materialized upcoming birthdays table forward to today"""
+    rolled = UpcomingBirthday.objects.roll_forward()
+    return f"Rolled {rolled} upcoming birthdays to next year"
+
+
+@shared_task
+def resync_site_stats():
+    """Recount the site-wide wish stats and refresh their cached totals"""
+    from .models import SiteWishStat
+    from .site_stats import sync
+
+    rows = SiteWishStat.objects.rebuild()
+    sync()
+
+    return f"Resynced {rows} site stat rows"
+
+
+@shared_task
+def flush_wish_counters():
+    """Write buffered wish views, likes and unique viewer sketches to the database"""
+    from .counters import wish_counters, wish_viewers
+
+    flushed = wish_counters.flush()
+    sketches = wish_viewers.flush()
+
+    return f"Flushed counters for {flushed} wishes, viewer sketches for {sketches}"
+
+
+@shared_task
+def flush_template_usage():
+    """Write buffered template usage counts to the database"""
+    from .template_catalog import flush_usage
 
-    for profile in profiles:
-        # Send reminder emails to users
-        print(f"Reminder: {profile.user.username}'s birthday is tomorrow")
+    flushed = flush_usage()
 
-    return f"Sent reminders for {profiles.count()} birthdays"
+    return f"Flushed usage for {flushed} templates"
 
 
 @shared_task
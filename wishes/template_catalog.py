@@ -0,0 +1,120 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+from .counters import CounterBuffer
+
+VERSION_KEY = 'wish_template_catalog_version'
+
+_catalog = None
+_lock = threading.Lock()
+
+template_usage = CounterBuffer('wishes.WishTemplate', ['usage_count'], prefix='template_usage')
+
+
+class TemplateCatalog:
+    """
+    Every WishTemplate, most used first, indexed by id, occasion and category.
+
+    Built once per process and version, so rendering template pickers never
+    touches the database.
+    """
+
+    __slots__ = ('version', 'templates', 'by_id', 'by_occasion', 'by_category')
+
+    def __init__(self, version, templates):
+        self.version = version
+        self.templates = tuple(templates)
+        self.by_id = {template.pk: template for template in self.templates}
+        self.by_occasion = {}
+        self.by_category = {}
+        for template in self.templates:
+            self.by_occasion.setdefault(template.occasion, []).append(template)
+            self.by_category.setdefault(template.category.lower(), []).append(template)
+
+    @classmethod
+    def build(cls, version):
+        """Load the catalog from the database in the model's default ordering"""
+        from .models import WishTemplate
+
+        return cls(version, WishTemplate.objects.all())
+
+    def __len__(self):
+        return len(self.templates)
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def filter(self, occasion=None, category=None, premium=None):
+        """Templates matching every given criterion, most used first"""
+        if occasion is not None:
+            templates = self.by_occasion.get(occasion, [])
+        elif category is not None:
+            templates = self.by_category.get(category.lower(), [])
+        else:
+            templates = self.templates
+
+        return [
+            template for template in templates
+            if (category is None or template.category.lower() == category.lower())
+            and (premium is None or template.is_premium == premium)
+        ]
+
+    def featured(self, limit=6):
+        """Most used free templates"""
+        return self.filter(premium=False)[:limit]
+
+
+def current_version():
+    """Return the shared catalog version, creating it if missing"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed with a timestamp so a flushed cache never hands out a
+        # version number that a stale process already holds.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Invalidate the catalog in every process"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+def get_template_catalog():
+    """Return this process's catalog, rebuilding it if the version moved"""
+    global _catalog
+
+    version = current_version()
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = TemplateCatalog.build(version)
+        return _catalog
+
+
+def record_usage(template_id):
+    """Count one use of a template; ignored for ids the catalog does not know"""
+    try:
+        template_id = int(template_id)
+    except (TypeError, ValueError):
+        return False
+    if get_template_catalog().get(template_id) is None:
+        return False
+    template_usage.add(template_id, 'usage_count')
+    return True
+
+
+def flush_usage():
+    """Write buffered template usage and reorder the catalog if anything changed"""
+    flushed = template_usage.flush()
+    if flushed:
+        bump_version()
+    return flushed
@@ -2,6 +2,7 @@ from datetime import datetime
 
 from django import template
 from django.utils import timezone
+from wishes.birthdays import birthday_facts
 
 register = template.Library()
 
@@ -26,36 +27,30 @@ def birthday_age(birthday):
     if not birthday:
         return None
 
-    today = timezone.now().date()
-    age = today.year - birthday.year
-
-    if (today.month, today.day) < (birthday.month, birthday.day):
-        age -= 1
-
-    return age
+    return birthday_facts([birthday])[0].age
 
 
-@register.simple_tag
-def wish_count(user):
-    """Get total wishes sent by user"""
-    from wishes.models import BirthdayWish
-    return BirthdayWish.objects.filter(sender=user, status='sent').count()
+def _wish_stat(context, user, field):
+    from wishes.loaders import WishStatsLoader
 
+    user_id = getattr(user, 'pk', user)
+    loader = getattr(context.get('request'), 'wish_stats', None)
+    if loader is None:
+        # Rendered outside a request (e.g. an email); look the one value up now
+        return WishStatsLoader().value(user_id, field)
+    return loader.load(user_id, field)
 
-@register.simple_tag
-def received_wish_count(user):
-    """Get total wishes received by user"""
-    from wishes.models import BirthdayWish
-    return BirthdayWish.objects.filter(recipient=user, status='sent').count()
 
+@register.simple_tag(takes_context=True)
+def wish_count(context, user):
+    """Get total wishes sent by user, batched with every other count on the page"""
+    return _wish_stat(context, user, 'sent_count')
 
-@register.inclusion_tag('wishes/components/upcoming_birthday_card.html')
-def show_upcoming_birthdays(limit=5):
-    """Display upcoming birthdays widget"""
-    from wishes.models import UserProfile
 
-    upcoming = UserProfile.objects.get_upcoming_birthdays(days=30)[:limit]
-    return {'birthdays': upcoming}
+@register.simple_tag(takes_context=True)
+def received_wish_count(context, user):
+    """Get total wishes received by user, batched with every other count on the page"""
+    return _wish_stat(context, user, 'received_count')
 
 
 @register.filter
@@ -1,12 +1,43 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core import mail
+from django.core.cache import cache, caches
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.template import Context, Template
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+import json
+import random
+from .birthday_index import get_birthday_index
+from .checks import check_rate_limit_cache
+from .counters import DirtyList, wish_counters, wish_viewers
+from .hll import HyperLogLog
+from .suggestions import AliasTable, get_suggestion_engine
+from .utils import (
+    generate_ai_wish, get_birthday_wishes_suggestions, schedule_birthday_wish, send_birthday_notifications
+)
+from .context_processors import birthday_context
+from .birthdays import birthday_facts
+from .ics import feed_token
+from .middleware import WishStatsLoaderMiddleware
+from .ratelimit import TokenBucket, admit, snapshot
+from .site_stats import get_sent_counts, total_wishes_sent
+from .template_catalog import get_template_catalog, record_usage
+from .tasks import (
+    check_birthdays_today, dispatch_due_wishes, drain_outbox, flush_template_usage, flush_wish_counters,
+    resync_site_stats, send_birthday_reminders, send_scheduled_wish
+)
 from .models import (
-    UserProfile, BirthdayWish, GroupWish,
-    GiftSuggestion, CalendarEvent
+    UserProfile, UpcomingBirthday, Contact, BirthdayWish, GroupWish,
+    GiftSuggestion, CalendarEvent, Outbox, SiteWishStat, UserSearchTerm, UserWishStats, WishTemplate
 )
+from .forms import BirthdayWishForm, CalendarEventForm
 
 
 class UserProfileModelTest(TestCase):
@@ -131,3 +162,1109 @@ class GiftSuggestionModelTest(TestCase):
         )
         self.assertEqual(gift.title, 'Smartwatch')
         self.assertEqual(gift.category, 'electronics')
+
+
+class UpcomingBirthdaysQueryTest(TestCase):
+    """Test cases for the indexed upcoming birthdays query"""
+
+    def setUp(self):
+        for username, birthday in [
+            ('dec', date(1990, 12, 30)),
+            ('jan', date(1985, 1, 3)),
+            ('leap', date(1992, 2, 29)),
+            ('far', date(1991, 6, 1)),
+        ]:
+            profile = User.objects.create_user(username=username, password='pass123').profile
+            profile.birthday = birthday
+            profile.save()
+
+    def upcoming(self, today, days):
+        now = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+        with mock.patch('wishes.managers.timezone.now', return_value=now):
+            return [p.user.username for p in UserProfile.objects.get_upcoming_birthdays(days=days)]
+
+    def test_birthday_ordinal_stored(self):
+        """Test the ordinal is kept in sync on save"""
+        self.assertEqual(User.objects.get(username='dec').profile.birthday_ordinal, 1230)
+
+    def test_window_wraps_new_year(self):
+        """Test December birthdays sort before January ones"""
+        self.assertEqual(self.upcoming(date(2025, 12, 28), 7), ['dec', 'jan'])
+
+    def test_leap_day_in_non_leap_year(self):
+        """Test Feb 29 birthdays show up on Feb 28 of non-leap years"""
+        self.assertEqual(self.upcoming(date(2025, 2, 20), 8), ['leap'])
+        self.assertEqual(self.upcoming(date(2025, 3, 1), 10), [])
+
+    def test_full_year_window_soonest_first(self):
+        """Test a window of a year or more still starts from today"""
+        self.assertEqual(self.upcoming(date(2025, 3, 1), 365), ['far', 'dec', 'jan', 'leap'])
+
+
+class BirthdayIndexTest(TestCase):
+    """Test cases for the in-process birthday index"""
+
+    def setUp(self):
+        self.profile = User.objects.create_user(username='indexed', password='pass123').profile
+        self.profile.birthday = date(1990, 12, 30)
+        self.profile.save()
+
+    def test_upcoming_wraps_new_year(self):
+        """Test bisect lookups across the New Year boundary"""
+        index = get_birthday_index()
+        self.assertEqual(index.upcoming(days=7, today=date(2025, 12, 28)), [self.profile.pk])
+        self.assertEqual(index.today(today=date(2025, 12, 30)), [self.profile.pk])
+        self.assertEqual(index.this_month(today=date(2025, 11, 1)), [])
+
+    def test_rebuilds_after_profile_change(self):
+        """Test a saved birthday invalidates the index"""
+        before = get_birthday_index()
+        self.profile.birthday = date(1990, 1, 2)
+        self.profile.save()
+        after = get_birthday_index()
+        self.assertIsNot(before, after)
+        self.assertEqual(after.today(today=date(2026, 1, 2)), [self.profile.pk])
+
+    def test_registration_without_birthday_keeps_index(self):
+        """Test a new profile only invalidates the index when it has a birthday"""
+        before = get_birthday_index()
+        User.objects.create_user(username='unindexed', password='pass123')
+        self.assertIs(get_birthday_index(), before)
+
+        self.profile.bio = 'Hello'
+        self.profile.save()
+        self.assertIs(get_birthday_index(), before)
+
+
+class AgeRangeQueryTest(TestCase):
+    """Test cases for SQL-side age range filtering"""
+
+    def setUp(self):
+        for username, birthday in [
+            ('baby', date(2025, 1, 1)),
+            ('thirty', date(1995, 6, 15)),
+            ('almost_thirty', date(1995, 6, 16)),
+        ]:
+            profile = User.objects.create_user(username=username, password='pass123').profile
+            profile.birthday = birthday
+            profile.save()
+
+    def ages(self, min_age=None, max_age=None):
+        now = timezone.make_aware(datetime(2025, 6, 15))
+        with mock.patch('wishes.managers.timezone.now', return_value=now):
+            profiles = UserProfile.objects.get_by_age_range(min_age, max_age)
+            return sorted(p.user.username for p in profiles)
+
+    def test_includes_age_zero(self):
+        """Test newborn profiles are not dropped"""
+        self.assertEqual(self.ages(max_age=0), ['baby'])
+
+    def test_bounds_are_inclusive(self):
+        """Test birthdays exactly on the boundary"""
+        self.assertEqual(self.ages(min_age=30), ['thirty'])
+        self.assertEqual(self.ages(min_age=29, max_age=29), ['almost_thirty'])
+
+
+class BirthdayFactsTest(TestCase):
+    """Test cases for batch next-birthday and age computation"""
+
+    def test_batch_matches_single_rows(self):
+        """Test next birthday, days until and age for a mixed batch"""
+        facts = birthday_facts([date(1990, 5, 15), None, date(1990, 3, 1)], today=date(2025, 3, 1))
+        self.assertEqual(facts[0], (date(2025, 5, 15), 75, 34))
+        self.assertIsNone(facts[1])
+        self.assertEqual(facts[2], (date(2025, 3, 1), 0, 35))
+
+    def test_leap_day_birthdays(self):
+        """Test Feb 29 birthdays fall on Feb 28 in non-leap years"""
+        leap = date(2000, 2, 29)
+        self.assertEqual(birthday_facts([leap], today=date(2025, 2, 28))[0], (date(2025, 2, 28), 0, 25))
+        self.assertEqual(birthday_facts([leap], today=date(2025, 3, 1))[0], (date(2026, 2, 28), 364, 25))
+        self.assertEqual(birthday_facts([leap], today=date(2027, 3, 1))[0], (date(2028, 2, 29), 365, 27))
+
+
+class TimezoneBucketTest(TestCase):
+    """Test cases for hourly, timezone-sharded birthday checks"""
+
+    def setUp(self):
+        follower = User.objects.create_user(username='follower', password='pass123')
+        for username, tz_name in [('tokyo', 'Asia/Tokyo'), ('reykjavik', 'Atlantic/Reykjavik')]:
+            user = User.objects.create_user(username=username, password='pass123')
+            user.profile.birthday = date(1990, 1, 2)
+            user.profile.timezone = tz_name
+            user.profile.save()
+            Contact.objects.create(owner=follower, contact=user)
+
+    def check_at(self, moment):
+        with mock.patch('wishes.tasks.timezone.now', return_value=moment):
+            return check_birthdays_today()
+
+    def test_offset_bucket_stored(self):
+        """Test profiles are bucketed by their whole-hour UTC offset"""
+        self.assertEqual(User.objects.get(username='tokyo').profile.utc_offset_bucket, 9)
+
+    def test_only_zones_at_local_midnight(self):
+        """Test each hourly run handles the zones whose day just started"""
+        self.assertEqual(self.check_at(datetime(2026, 1, 1, 15, tzinfo=dt_timezone.utc)),
+                         'Processed 1 birthdays, 1 notifications')
+        self.assertEqual(self.check_at(datetime(2026, 1, 1, 0, tzinfo=dt_timezone.utc)),
+                         'Processed 0 birthdays, 0 notifications')
+        self.assertEqual(self.check_at(datetime(2026, 1, 2, 0, tzinfo=dt_timezone.utc)),
+                         'Processed 1 birthdays, 1 notifications')
+
+
+class ContactFeedTest(TestCase):
+    """Test cases for per-user upcoming birthday feeds"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer', password='pass123')
+        for username in ['friend', 'stranger']:
+            user = User.objects.create_user(username=username, password='pass123')
+            user.profile.birthday = timezone.now().date()
+            user.profile.save()
+        Contact.objects.create(owner=self.viewer, contact=User.objects.get(username='friend'))
+
+    def test_feed_limited_to_contacts(self):
+        """Test only followed users appear in the feed"""
+        feed = UserProfile.objects.get_upcoming_birthdays_for(self.viewer, days=7)
+        self.assertEqual([p.user.username for p in feed], ['friend'])
+
+    def test_add_contact_via_api(self):
+        """Test contacts can be added through the API"""
+        self.client.login(username='viewer', password='pass123')
+        stranger = User.objects.get(username='stranger')
+        response = self.client.post('/api/v1/contacts/', {'contact': stranger.pk})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Contact.objects.filter(owner=self.viewer, contact=stranger).exists())
+
+
+class UpcomingBirthdayTableTest(TestCase):
+    """Test cases for the materialized upcoming birthdays table"""
+
+    def setUp(self):
+        self.profile = User.objects.create_user(username='rolling', password='pass123').profile
+        self.profile.birthday = date(1990, 3, 10)
+        self.profile.save()
+
+    def at(self, day):
+        now = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+        return mock.patch('wishes.managers.timezone.now', return_value=now)
+
+    def test_profile_save_updates_row(self):
+        """Test saving a profile refreshes only its own row"""
+        row = UpcomingBirthday.objects.get(profile=self.profile)
+        self.assertEqual((row.next_date.month, row.next_date.day), (3, 10))
+
+        self.profile.birthday = None
+        self.profile.save()
+        self.assertFalse(UpcomingBirthday.objects.filter(profile=self.profile).exists())
+
+    def test_roll_forward(self):
+        """Test nightly roll-forward shifts pending rows and recomputes passed ones"""
+        with self.at(date(2025, 3, 1)):
+            UpcomingBirthday.objects.rebuild()
+        with self.at(date(2025, 3, 5)):
+            UpcomingBirthday.objects.roll_forward()
+        row = UpcomingBirthday.objects.get(profile=self.profile)
+        self.assertEqual((row.next_date, row.days_until, row.age_turning), (date(2025, 3, 10), 5, 35))
+
+        with self.at(date(2025, 3, 11)):
+            self.assertEqual(UpcomingBirthday.objects.roll_forward(), 1)
+        row = UpcomingBirthday.objects.get(profile=self.profile)
+        self.assertEqual((row.next_date, row.days_until, row.age_turning), (date(2026, 3, 10), 364, 36))
+
+    def test_roll_forward_drops_cleared_birthdays(self):
+        """Test a birthday cleared without save() drops its row instead of failing the run"""
+        with self.at(date(2025, 3, 1)):
+            UpcomingBirthday.objects.rebuild()
+        UserProfile.objects.filter(pk=self.profile.pk).update(birthday=None)
+
+        with self.at(date(2025, 3, 11)):
+            self.assertEqual(UpcomingBirthday.objects.roll_forward(), 0)
+        self.assertFalse(UpcomingBirthday.objects.exists())
+
+
+class CalendarDataTest(TestCase):
+    """Test cases for the windowed calendar data endpoint"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cal', password='pass123', first_name='Cal')
+        self.user.profile.birthday = date(1992, 2, 29)
+        self.user.profile.save()
+        self.client.login(username='cal', password='pass123')
+
+    def fetch(self, start, end):
+        response = self.client.get(reverse('calendar_data'), {'start': start, 'end': end})
+        return response.status_code, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_only_visible_range(self):
+        """Test birthdays are returned only for the requested window"""
+        status, body = self.fetch('2025-02-01T00:00:00', '2025-03-01T00:00:00')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), [{
+            'title': "Cal's Birthday", 'date': '2025-02-28', 'user_id': self.user.pk, 'age': 33,
+        }])
+        self.assertEqual(json.loads(self.fetch('2025-03-01', '2025-04-01')[1]), [])
+
+    def test_rejects_bad_range(self):
+        """Test missing, impossible or oversized windows are rejected"""
+        self.assertEqual(self.fetch('', '')[0], 400)
+        self.assertEqual(self.fetch('2025-02-01', '2025-02-30')[0], 400)
+        self.assertEqual(self.fetch('2025-01-01', '2027-01-01')[0], 400)
+
+
+class IcsFeedTest(TestCase):
+    """Test cases for the tokenized ICS calendar feed"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='subscriber', password='pass123')
+        friend = User.objects.create_user(username='leapling', password='pass123')
+        friend.profile.birthday = date(1992, 2, 29)
+        friend.profile.save()
+        Contact.objects.create(owner=self.owner, contact=friend)
+        self.url = reverse('ics_feed', args=[feed_token(self.owner)])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body.decode()
+
+    def test_feed_contains_yearly_birthdays(self):
+        """Test contacts' birthdays are exported as yearly recurring events"""
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('DTSTART;VALUE=DATE:19920229', body)
+        self.assertIn('RRULE:FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=-1', body)
+
+    def test_repeat_poll_is_not_modified(self):
+        """Test a poll with a matching ETag returns 304 without queries"""
+        response, _ = self.get()
+        with self.assertNumQueries(0):
+            repeat, _ = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        Contact.objects.filter(owner=self.owner).delete()
+        changed, body = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotIn('BEGIN:VEVENT', body)
+
+    def test_tampered_token(self):
+        """Test a forged token is rejected"""
+        response = self.client.get(reverse('ics_feed', args=[f'{self.owner.pk}:forged']))
+        self.assertEqual(response.status_code, 404)
+
+
+class BirthdayContextTest(TestCase):
+    """Test cases for the cached, lazy birthday context processor"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='ctx_viewer', password='pass123')
+        friend = User.objects.create_user(username='ctx_friend', password='pass123')
+        friend.profile.birthday = timezone.now().date()
+        friend.profile.save()
+        Contact.objects.create(owner=self.viewer, contact=friend)
+
+    def context(self):
+        request = RequestFactory().get('/')
+        request.user = self.viewer
+        return birthday_context(request)
+
+    def test_unused_values_cost_nothing(self):
+        """Test nothing is computed until a value is rendered"""
+        with self.assertNumQueries(0):
+            self.context()
+
+    def test_values_cached_until_midnight(self):
+        """Test counts are computed once and then served from cache"""
+        self.assertEqual(str(self.context()['today_birthdays_count']), '1')
+        with self.assertNumQueries(0):
+            context = self.context()
+            self.assertEqual(str(context['upcoming_birthdays_count']), '1')
+            self.assertEqual(str(context['today_birthdays_count']), '1')
+
+
+class UserWishStatsTest(TestCase):
+    """Test cases for the denormalized per-user wish counters"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='stats_sender', password='pass123')
+        self.recipient = User.objects.create_user(username='stats_recipient', password='pass123')
+
+    def wish(self, status='draft'):
+        return BirthdayWish.objects.create(
+            sender=self.sender, recipient=self.recipient, text_content='Hi', status=status
+        )
+
+    def counts(self, user):
+        stats = UserWishStats.objects.for_user(user)
+        return stats.sent_count, stats.received_count, stats.scheduled_count
+
+    def test_counters_follow_status_changes(self):
+        """Test creating, sending and deleting wishes moves the counters"""
+        wish = self.wish(status='scheduled')
+        self.assertEqual(self.counts(self.sender), (0, 0, 1))
+
+        BirthdayWish.objects.get(pk=wish.pk).mark_as_sent()
+        self.assertEqual(self.counts(self.sender), (1, 0, 0))
+        self.assertEqual(self.counts(self.recipient), (0, 1, 0))
+
+        BirthdayWish.objects.get(pk=wish.pk).delete()
+        self.assertEqual(self.counts(self.sender), (0, 0, 0))
+        self.assertEqual(self.counts(self.recipient), (0, 0, 0))
+
+    def test_bulk_update_status(self):
+        """Test queryset status changes only count rows that actually moved"""
+        self.wish()
+        self.wish(status='sent')
+        updated = BirthdayWish.objects.filter(sender=self.sender).update_status('sent')
+        self.assertEqual(updated, 1)
+        self.assertEqual(self.counts(self.sender), (2, 0, 0))
+        self.assertEqual(self.counts(self.recipient), (0, 2, 0))
+
+    def test_rebuild_matches_counts(self):
+        """Test rebuild recounts drifted counters from the wish table"""
+        self.wish(status='sent')
+        UserWishStats.objects.filter(user=self.sender).update(sent_count=99)
+        UserWishStats.objects.rebuild(chunk_size=1)
+        self.assertEqual(self.counts(self.sender), (1, 0, 0))
+        self.assertEqual(self.counts(self.recipient), (0, 1, 0))
+
+
+class DashboardFragmentTest(TestCase):
+    """Test cases for the cached dashboard panels"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='dash_user', password='pass123')
+        self.friend = User.objects.create_user(username='dash_friend', password='pass123')
+        self.client.login(username='dash_user', password='pass123')
+
+    def test_repeat_render_served_from_fragments(self):
+        """Test a warm dashboard only loads the session and user"""
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_wish_invalidates_panels(self):
+        """Test a received wish shows up on the next render"""
+        self.client.get(reverse('dashboard'))
+        BirthdayWish.objects.create(sender=self.friend, recipient=self.user, text_content='Hey', status='sent')
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'From: dash_friend')
+
+
+class WishCountTagTest(TestCase):
+    """Test cases for the request-batched wish count tags"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'count_{i}', password='pass123') for i in range(5)]
+        for recipient in self.users[1:]:
+            BirthdayWish.objects.create(sender=self.users[0], recipient=recipient, status='sent')
+
+    def render(self, source, **context):
+        middleware = WishStatsLoaderMiddleware(lambda request: None)
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        template = Template('{% load wish_tags %}' + source)
+        html = template.render(Context({'request': request, **context}))
+        return middleware.process_response(request, HttpResponse(html)).content.decode()
+
+    def test_counts_resolved_in_one_query(self):
+        """Test every count on a page costs a single query in total"""
+        source = '{% for u in users %}{% wish_count u %}/{% received_wish_count u %} {% endfor %}'
+        with self.assertNumQueries(1):
+            html = self.render(source, users=self.users)
+        self.assertEqual(html, '4/0 0/1 0/1 0/1 0/1 ')
+
+    def test_unrendered_counts_cost_nothing(self):
+        """Test a count assigned but never shown is never fetched"""
+        with self.assertNumQueries(0):
+            self.render('{% wish_count u as unused %}done', u=self.users[0])
+
+    def test_numeric_use_forces_batch(self):
+        """Test comparing a count evaluates it"""
+        html = self.render('{% wish_count u as n %}{% if n > 3 %}busy{% endif %}', u=self.users[0])
+        self.assertEqual(html, 'busy')
+
+
+class SiteStatsTest(TestCase):
+    """Test cases for the incrementally maintained site-wide stats"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='site_sender', password='pass123')
+        self.recipient = User.objects.create_user(username='site_recipient', password='pass123')
+        cache.clear()
+
+    def test_sent_wishes_counted_per_type(self):
+        """Test status transitions adjust the cached totals after commit"""
+        self.assertEqual(total_wishes_sent(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            BirthdayWish.objects.create(sender=self.sender, recipient=self.recipient, status='sent')
+            BirthdayWish.objects.create(sender=self.sender, recipient=self.recipient, wish_type='card')
+        with self.captureOnCommitCallbacks(execute=True):
+            BirthdayWish.objects.filter(wish_type='card').update_status('sent')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_sent_counts()['card'], 1)
+            self.assertEqual(total_wishes_sent(), 2)
+
+    def test_cache_miss_falls_back_to_table(self):
+        """Test a cold cache is filled from SiteWishStat, and resync recounts"""
+        BirthdayWish.objects.create(sender=self.sender, recipient=self.recipient, status='sent')
+        SiteWishStat.objects.update(sent_count=7)
+        cache.clear()
+        self.assertEqual(total_wishes_sent(), 7)
+
+        resync_site_stats()
+        self.assertEqual(total_wishes_sent(), 1)
+
+    def test_changes_booked_to_the_day_sent(self):
+        """Test wishes are counted against the day they were sent, as rebuild dates them"""
+        sent_date = timezone.now() - timedelta(days=3)
+        for _ in range(2):
+            BirthdayWish.objects.create(sender=self.sender, recipient=self.recipient, status='sent',
+                                        sent_date=sent_date)
+        wish = BirthdayWish.objects.first()
+        wish.status = 'draft'
+        wish.save()
+        BirthdayWish.objects.create(sender=self.sender, recipient=self.recipient).mark_as_sent()
+
+        booked = dict(SiteWishStat.objects.filter(sent_count__gt=0).values_list('day', 'sent_count'))
+        self.assertEqual(booked, {timezone.localdate(sent_date): 1, timezone.localdate(): 1})
+        resync_site_stats()
+        self.assertEqual(dict(SiteWishStat.objects.values_list('day', 'sent_count')), booked)
+
+
+class WishCounterBufferTest(TestCase):
+    """Test cases for the write-behind views and likes counters"""
+
+    def setUp(self):
+        cache.clear()
+        self.sender = User.objects.create_user(username='buf_sender', password='pass123')
+        self.viewer = User.objects.create_user(username='buf_viewer', password='pass123')
+        self.wish = BirthdayWish.objects.create(sender=self.sender, recipient=self.viewer, status='sent')
+
+    def test_events_never_touch_the_row_until_flushed(self):
+        """Test views are buffered, merged on read and flushed as one update"""
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                wish_counters.add(self.wish.pk, 'views_count')
+            wish_counters.add(self.wish.pk, 'likes_count')
+
+        self.assertEqual(wish_counters.current(self.wish, 'views_count'), 3)
+
+        with self.assertNumQueries(4):
+            # Savepoint, one UPDATE per (field, delta) group, release
+            flush_wish_counters()
+
+        self.wish.refresh_from_db()
+        self.assertEqual((self.wish.views_count, self.wish.likes_count), (3, 1))
+        self.assertEqual(wish_counters.current(self.wish, 'views_count'), 3)
+
+    def test_delta_keys_expire_once_flushed(self):
+        """Test delta keys get a timeout, renewed by the first event after a flush"""
+        key = f'wish_counters:views_count:{self.wish.pk}'
+        with mock.patch('wishes.counters.cache.add', wraps=cache.add) as add:
+            wish_counters.add(self.wish.pk, 'views_count')
+        add.assert_any_call(key, 1, wish_counters.timeout)
+
+        flush_wish_counters()
+        with mock.patch('wishes.counters.cache.touch', wraps=cache.touch) as touch:
+            wish_counters.add(self.wish.pk, 'views_count')
+            wish_counters.add(self.wish.pk, 'views_count')
+        touch.assert_called_once_with(key, wish_counters.timeout)
+
+    def test_stale_save_keeps_flushed_counts(self):
+        """Test saving an old instance does not overwrite flushed counts"""
+        stale = BirthdayWish.objects.get(pk=self.wish.pk)
+        wish_counters.add(self.wish.pk, 'likes_count', 2)
+        flush_wish_counters()
+
+        stale.text_content = 'Edited'
+        stale.save()
+        self.wish.refresh_from_db()
+        self.assertEqual(self.wish.likes_count, 2)
+
+    def test_drain_waits_for_a_slot_being_written(self):
+        """Test an id whose slot is written after its number was taken is not lost"""
+        dirty = DirtyList('dirty_test')
+        dirty.mark('1')
+        # Another writer has taken slot 2 but not written it yet
+        seq = cache.incr('dirty_test:seq')
+        dirty.mark('3')
+
+        self.assertEqual(dirty.drain(), ['1'])
+        cache.set(f'dirty_test:slot:{seq}', '2', None)
+        self.assertEqual(sorted(dirty.drain()), ['2', '3'])
+
+        # A slot still empty on the next flush is skipped rather than blocking the list
+        cache.incr('dirty_test:seq')
+        dirty.mark('4')
+        self.assertEqual(dirty.drain(), [])
+        self.assertEqual(dirty.drain(), ['4'])
+
+    def test_flush_sees_events_from_another_cache_client(self):
+        """Test a worker's flush drains events a web process recorded through its own client"""
+        self.assertNotIn('locmem', settings.CACHES['default']['BACKEND'].lower())
+
+        web_cache = caches.create_connection('default')
+        with mock.patch('wishes.counters.cache', web_cache):
+            wish_counters.add(self.wish.pk, 'views_count', 2)
+            wish_counters.add(self.wish.pk, 'likes_count')
+
+        self.assertEqual(flush_wish_counters(), 'Flushed counters for 1 wishes, viewer sketches for 0')
+        self.wish.refresh_from_db()
+        self.assertEqual((self.wish.views_count, self.wish.likes_count), (2, 1))
+
+    def test_api_hides_anonymous_sender(self):
+        """Test an anonymous public wish does not reveal its sender to others"""
+        self.wish.is_public = True
+        self.wish.is_anonymous = True
+        self.wish.save()
+        User.objects.create_user(username='buf_stranger', password='pass123')
+
+        for username, visible in [('buf_stranger', False), ('buf_viewer', False), ('buf_sender', True)]:
+            self.client.login(username=username, password='pass123')
+            data = self.client.get(f'/api/v1/wishes/{self.wish.pk}/').json()
+            self.assertEqual(data['sender'], self.sender.pk if visible else None)
+            self.assertEqual(data['sender_name'], 'buf_sender' if visible else '')
+
+    def test_api_retrieve_counts_view(self):
+        """Test the API records a view and reports it before any flush"""
+        self.client.login(username='buf_viewer', password='pass123')
+        response = self.client.get(f'/api/v1/wishes/{self.wish.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['views_count'], 1)
+
+    def test_api_like_counts_once_per_user(self):
+        """Test liking a wish again does not add to its likes count"""
+        self.client.login(username='buf_viewer', password='pass123')
+        first = self.client.post(f'/api/v1/wishes/{self.wish.pk}/like/').json()
+        second = self.client.post(f'/api/v1/wishes/{self.wish.pk}/like/').json()
+        self.assertEqual((first['liked'], second['liked']), (True, False))
+        self.assertEqual(second['likes_count'], 1)
+
+
+class UniqueViewerSketchTest(TestCase):
+    """Test cases for HyperLogLog unique viewer estimates"""
+
+    def test_estimate_within_error(self):
+        """Test a 4 KB sketch estimates large cardinalities within a few percent"""
+        sketch = HyperLogLog()
+        for i in range(50000):
+            sketch.add(i)
+        self.assertEqual(len(sketch.registers), 4096)
+        self.assertAlmostEqual(sketch.count() / 50000, 1, delta=0.05)
+
+    def test_merge_matches_union(self):
+        """Test merging overlapping sketches counts the union once"""
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(300):
+            first.add(i)
+            second.add(i + 150)
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        self.assertAlmostEqual(merged.count(), 450, delta=15)
+
+    def test_buffered_viewers_flushed_and_rolled_up(self):
+        """Test repeat viewers count once, survive a flush and roll up per recipient"""
+        cache.clear()
+        sender = User.objects.create_user(username='hll_sender', password='pass123')
+        recipient = User.objects.create_user(username='hll_recipient', password='pass123')
+        wishes = [
+            BirthdayWish.objects.create(sender=sender, recipient=recipient, status='sent', is_public=True)
+            for _ in range(2)
+        ]
+        for viewer_id in range(40):
+            wish_viewers.add(wishes[0].pk, viewer_id)
+            wish_viewers.add(wishes[0].pk, viewer_id)
+            wish_viewers.add(wishes[1].pk, viewer_id + 20)
+
+        self.assertEqual(wish_viewers.estimate(wishes[0]), 40)
+        flush_wish_counters()
+        cache.clear()
+
+        stored = BirthdayWish.objects.get(pk=wishes[0].pk)
+        self.assertEqual(wish_viewers.estimate(stored), 40)
+        self.assertEqual(BirthdayWish.objects.get_unique_viewers_for(recipient), 60)
+
+    def test_add_waits_for_the_sketch_lock(self):
+        """Test a writer never overwrites a sketch another writer holds"""
+        cache.clear()
+        self.assertTrue(wish_viewers.add(1, 'first'))
+        cache.add('wish_viewers:sketch:1:lock', 1, 5)
+        with mock.patch('wishes.counters.time.sleep'):
+            self.assertFalse(wish_viewers.add(1, 'second'))
+        cache.delete('wish_viewers:sketch:1:lock')
+        self.assertEqual(HyperLogLog.from_bytes(cache.get('wish_viewers:sketch:1')).count(), 1)
+
+
+class TemplateCatalogTest(TestCase):
+    """Test cases for the in-process template catalog and batched usage counts"""
+
+    def setUp(self):
+        cache.clear()
+        self.funny = WishTemplate.objects.create(title='Funny', content='Ha', category='funny')
+        self.warm = WishTemplate.objects.create(title='Warm', content='Aw', category='heartfelt', occasion='milestone')
+
+    def test_lookups_without_queries(self):
+        """Test a built catalog answers by occasion and category from memory"""
+        get_template_catalog()
+        with self.assertNumQueries(0):
+            catalog = get_template_catalog()
+            self.assertEqual(catalog.filter(occasion='milestone'), [self.warm])
+            self.assertEqual(catalog.filter(category='Funny'), [self.funny])
+
+    def test_save_rebuilds_catalog(self):
+        """Test saving a template bumps the version"""
+        get_template_catalog()
+        self.funny.title = 'Funnier'
+        self.funny.save()
+        self.assertEqual(get_template_catalog().get(self.funny.pk).title, 'Funnier')
+
+    def test_usage_flushed_in_bulk_and_reorders(self):
+        """Test recorded usage is written by the flush and moves the template up"""
+        for _ in range(3):
+            self.assertTrue(record_usage(str(self.warm.pk)))
+        self.assertFalse(record_usage('nope'))
+        self.assertEqual(WishTemplate.objects.get(pk=self.warm.pk).usage_count, 0)
+
+        flush_template_usage()
+        self.assertEqual(WishTemplate.objects.get(pk=self.warm.pk).usage_count, 3)
+        self.assertEqual(get_template_catalog().templates[0], self.warm)
+
+
+class SuggestionEngineTest(TestCase):
+    """Test cases for the weighted wish suggestion engine"""
+
+    def setUp(self):
+        cache.clear()
+        self.popular = WishTemplate.objects.create(title='Pop', content='Popular one', category='funny', usage_count=99)
+        self.rare = WishTemplate.objects.create(title='Rare', content='Rare one', category='funny')
+        self.kind = WishTemplate.objects.create(title='Kind', content='Kind one', category='heartfelt')
+
+    def test_alias_table_follows_weights(self):
+        """Test draws are distributed by weight"""
+        table = AliasTable([1, 3])
+        rng = random.Random(7)
+        draws = [table.sample(rng) for _ in range(4000)]
+        self.assertAlmostEqual(draws.count(1) / 4000, 0.75, delta=0.03)
+
+    def test_suggestions_come_from_templates(self):
+        """Test pools are built per category and top-k follows usage"""
+        self.assertEqual(get_birthday_wishes_suggestions(category='funny', weighted=False), ['Popular one', 'Rare one'])
+        self.assertEqual(get_birthday_wishes_suggestions(category='heartfelt'), ['Kind one'])
+        self.assertIn('Kind one', generate_ai_wish('show me a heartfelt template', None))
+
+    def test_template_intent_keeps_keyword_precedence(self):
+        """Test earlier chatbot keywords still win over the template intent"""
+        self.assertIn('How can I help', generate_ai_wish('hello, any templates?', None))
+        self.assertIn('perfect gift', generate_ai_wish('a gift or a template?', None))
+
+    def test_unchanged_pools_reused(self):
+        """Test a template change only rebuilds the pools it belongs to"""
+        before = get_suggestion_engine()
+        funny = before.pool(category='funny')
+        self.kind.content = 'Kinder one'
+        self.kind.save()
+        after = get_suggestion_engine()
+        self.assertIsNot(after, before)
+        self.assertIs(after.pool(category='funny'), funny)
+        self.assertEqual(after.suggest(category='heartfelt'), ['Kinder one'])
+
+
+class UserAutocompleteTest(TestCase):
+    """Test cases for prefix autocomplete and the id-only recipient widget"""
+
+    def setUp(self):
+        self.client = Client()
+        self.me = User.objects.create_user(username='ac_me', password='pass123')
+        self.anna = User.objects.create_user(username='ac_anna', first_name='Anna', last_name='Berg', password='pass123')
+        self.bob = User.objects.create_user(username='ac_bob', first_name='Bob', last_name='Annis', password='pass123')
+        self.client.login(username='ac_me', password='pass123')
+
+    def search(self, query):
+        response = self.client.get(reverse('user_autocomplete'), {'q': query})
+        return [result['username'] for result in response.json()['results']]
+
+    def test_matches_any_name_prefix(self):
+        """Test username, first, last and full name prefixes all match, case-insensitively"""
+        self.assertEqual(self.search('ANN'), ['ac_anna', 'ac_bob'])
+        self.assertEqual(self.search('anna b'), ['ac_anna'])
+        self.assertEqual(self.search('ac_'), ['ac_anna', 'ac_bob'])
+        self.assertEqual(self.search(''), [])
+
+    def test_terms_follow_renames(self):
+        """Test renaming a user replaces their search terms"""
+        self.bob.first_name = 'Robert'
+        self.bob.save()
+        self.assertEqual(self.search('bob'), [])
+        self.assertEqual(self.search('rob'), ['ac_bob'])
+        self.assertFalse(UserSearchTerm.objects.filter(term='bob').exists())
+
+    def test_calendar_event_resolves_user_to_profile(self):
+        """Test the birthday person picker submits a user id and saves that user's profile"""
+        self.anna.profile.delete()
+        profile = UserProfile.objects.create(user=self.anna)
+        self.assertNotEqual(profile.pk, self.anna.pk)
+
+        now = timezone.now().strftime('%Y-%m-%dT%H:%M')
+        form = CalendarEventForm({'birthday_person': self.anna.pk, 'event_title': 'Party', 'event_date': now})
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.user = self.me
+        event = form.save()
+        self.assertEqual(event.birthday_person, profile)
+        self.assertEqual(CalendarEventForm(instance=event)['birthday_person'].value(), self.anna.pk)
+
+    def test_matches_names_outside_the_bmp(self):
+        """Test a prefix followed by an astral-plane character still matches"""
+        User.objects.create_user(username='ac_star', first_name='Zo\U0001f31f', password='pass123')
+        self.assertEqual(self.search('zo'), ['ac_star'])
+
+    def test_widget_renders_without_listing_users(self):
+        """Test the form renders without querying users and validates by primary key"""
+        form = BirthdayWishForm(user=self.me)
+        with self.assertNumQueries(0):
+            html = str(form['recipient'])
+        self.assertIn('data-user-autocomplete', html)
+        self.assertNotIn('ac_anna', html)
+
+        form = BirthdayWishForm({'recipient': self.anna.pk, 'wish_type': 'text'}, user=self.me)
+        with self.assertNumQueries(1):
+            self.assertEqual(form.fields['recipient'].clean(self.anna.pk), self.anna)
+
+
+class DirtyFieldsMixinTest(TestCase):
+    """Test cases for saves that write only changed columns"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='dirty_sender', password='pass123')
+        self.recipient = User.objects.create_user(username='dirty_recipient', password='pass123')
+        wish = BirthdayWish.objects.create(
+            sender=self.sender, recipient=self.recipient, text_content='Hi', status='scheduled'
+        )
+        self.wish = BirthdayWish.objects.get(pk=wish.pk)
+
+    def updates(self, captured, table):
+        return [q['sql'] for q in captured.captured_queries if q['sql'].startswith(f'UPDATE "{table}"')]
+
+    def test_unchanged_save_writes_nothing(self):
+        """Test saving a freshly loaded instance issues no UPDATE"""
+        with CaptureQueriesContext(connection) as captured:
+            self.wish.save()
+        self.assertEqual(self.updates(captured, BirthdayWish._meta.db_table), [])
+        self.assertFalse(self.wish.is_dirty())
+
+        profile = UserProfile.objects.get(user=self.sender)
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_mark_as_sent_writes_changed_columns(self):
+        """Test only status, sent_date and the auto_now timestamp are written"""
+        with CaptureQueriesContext(connection) as captured:
+            self.wish.mark_as_sent()
+        [sql] = self.updates(captured, BirthdayWish._meta.db_table)
+        assigned = sql.split(' SET ', 1)[1].split(' WHERE ', 1)[0]
+        self.assertEqual(assigned.count(' = '), 3)
+        for column in ('"status"', '"sent_date"', '"updated_at"'):
+            self.assertIn(column, assigned)
+        self.assertNotIn('"text_content"', assigned)
+        self.assertFalse(self.wish.is_dirty())
+
+        self.wish.refresh_from_db()
+        self.assertEqual(self.wish.status, 'sent')
+        self.assertEqual(UserWishStats.objects.for_user(self.sender).sent_count, 1)
+
+    def test_login_does_not_rewrite_profile(self):
+        """Test a User save leaves an untouched or unloaded profile alone"""
+        user = User.objects.select_related('profile').get(pk=self.sender.pk)
+        with CaptureQueriesContext(connection) as captured:
+            user.last_login = timezone.now()
+            user.save(update_fields=['last_login'])
+        self.assertEqual(self.updates(captured, UserProfile._meta.db_table), [])
+
+        user.profile.bio = 'Hello'
+        user.save()
+        self.assertEqual(UserProfile.objects.get(user=user).bio, 'Hello')
+
+
+class DueWishDispatcherTest(TestCase):
+    """Test cases for claiming and sending due scheduled wishes in batches"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='due_sender', password='pass123')
+        self.recipient = User.objects.create_user(username='due_recipient', email='due@example.com', password='pass123')
+
+    def schedule(self, when):
+        wish = BirthdayWish.objects.create(
+            sender=self.sender, recipient=self.recipient, text_content='Happy birthday!', scheduled_date=when
+        )
+        self.assertTrue(schedule_birthday_wish(wish))
+        return wish
+
+    def test_dispatches_only_due_wishes_once(self):
+        """Test due wishes are sent in batches and never twice"""
+        now = timezone.now()
+        due = [self.schedule(now - timedelta(minutes=i)) for i in range(5)]
+        later = self.schedule(now + timedelta(days=1))
+        self.assertEqual(UserWishStats.objects.for_user(self.sender).scheduled_count, 6)
+
+        result = dispatch_due_wishes(batch_size=2)
+        self.assertIn('Dispatched 5 due wishes', result)
+        self.assertEqual(Outbox.objects.count(), 5)
+        self.assertEqual(len(mail.outbox), 0)
+        drain_outbox()
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            set(BirthdayWish.objects.filter(status='sent').values_list('pk', flat=True)), {w.pk for w in due}
+        )
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'scheduled')
+
+        stats = UserWishStats.objects.for_user(self.sender)
+        self.assertEqual((stats.sent_count, stats.scheduled_count), (5, 1))
+
+        self.assertIn('Dispatched 0 due wishes', dispatch_due_wishes(batch_size=2))
+        self.assertEqual(send_scheduled_wish(due[0].pk), f"Wish {due[0].pk} already sent")
+        drain_outbox()
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_claim_respects_batch_size(self):
+        """Test a claim takes the oldest due wishes first"""
+        now = timezone.now()
+        wishes = [self.schedule(now - timedelta(hours=i)) for i in range(3)]
+        won = BirthdayWish.objects.claim_pending_wishes(batch_size=2, now=now)
+        self.assertEqual(set(won), {wishes[1].pk, wishes[2].pk})
+        claimed = BirthdayWish.objects.filter(pk__in=won)
+        self.assertTrue(all(w.status == 'sent' and w.sent_date == now for w in claimed))
+
+
+class BulkNotificationTest(TestCase):
+    """Test cases for pooled, batched notification delivery"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='bulk_sender', password='pass123')
+        self.wishes = [
+            BirthdayWish.objects.create(
+                sender=self.sender, text_content=f'Wish {i}',
+                recipient=User.objects.create_user(username=f'bulk_{i}', email=f'bulk_{i}@example.com' if i else '')
+            )
+            for i in range(5)
+        ]
+
+    def test_reports_each_message(self):
+        """Test every wish gets a delivery result and recipients without email are skipped"""
+        results = send_birthday_notifications(self.wishes, batch_size=2)
+        self.assertEqual(results, {wish.pk: bool(wish.recipient.email) for wish in self.wishes})
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f'bulk_{i}@example.com' for i in range(1, 5)])
+
+    def test_reuses_connection_per_batch(self):
+        """Test one connection is opened per batch and failures stay per message"""
+        connection = mail.get_connection()
+        sent = connection.send_messages
+        calls = []
+
+        def flaky(messages):
+            calls.append(messages[0].to[0])
+            if messages[0].to[0] == 'bulk_2@example.com':
+                raise OSError('rejected')
+            return sent(messages)
+
+        with mock.patch.object(connection, 'open', wraps=connection.open) as opened, \
+                mock.patch.object(connection, 'send_messages', side_effect=flaky):
+            results = send_birthday_notifications(self.wishes, batch_size=3, connection=connection)
+
+        self.assertEqual(opened.call_count, 2)
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(sum(results.values()), 3)
+        self.assertFalse(results[self.wishes[2].pk])
+
+    def test_reminders_use_bulk_send(self):
+        """Test followers of tomorrow's birthday people are emailed"""
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        birthday_user = User.objects.create_user(username='bulk_birthday', first_name='Tom', password='pass123')
+        birthday_user.profile.birthday = date(1992, tomorrow.month, tomorrow.day)
+        birthday_user.profile.save()
+        Contact.objects.create(owner=self.wishes[1].recipient, contact=birthday_user)
+        Contact.objects.create(owner=self.wishes[0].recipient, contact=birthday_user)
+
+        self.assertEqual(send_birthday_reminders(), 'Sent reminders for 1 birthdays, 1 of 1 emails delivered, 0 rate limited')
+        self.assertEqual(mail.outbox[0].to, ['bulk_1@example.com'])
+        self.assertIn('Tom', mail.outbox[0].subject)
+
+
+class OutboxTest(TestCase):
+    """Test cases for the transactional notification outbox"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='outbox_sender', password='pass123')
+        self.recipient = User.objects.create_user(username='outbox_recipient', email='outbox@example.com')
+        self.wish = BirthdayWish.objects.create(sender=self.sender, recipient=self.recipient, text_content='Hi')
+
+    def test_mark_as_sent_queues_once(self):
+        """Test sending queues one notification and delivers nothing inline"""
+        self.wish.mark_as_sent()
+        self.wish.mark_as_sent()
+        self.assertEqual(Outbox.objects.filter(wish=self.wish).count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(drain_outbox(), 'Delivered 1 notifications, 0 to retry, 0 failed, 0 rate limited')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(Outbox.objects.exists())
+
+    def test_create_wish_does_not_deliver_inline(self):
+        """Test the create view only queues the notification"""
+        self.client.login(username='outbox_sender', password='pass123')
+        with mock.patch('wishes.utils.send_bulk_mail') as send:
+            self.client.post(reverse('create_wish'), {'recipient': self.recipient.pk, 'wish_type': 'text',
+                                                      'text_content': 'Hello'})
+        send.assert_not_called()
+        self.assertEqual(Outbox.objects.count(), 1)
+
+    def test_retries_with_backoff_then_fails(self):
+        """Test failed sends back off and the entry, not the wish, is marked failed after the last attempt"""
+        self.wish.mark_as_sent()
+        entry = Outbox.objects.get()
+
+        with self.settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_DELAY=60), \
+                mock.patch('wishes.tasks.send_birthday_notifications', return_value={self.wish.pk: False}):
+            self.assertEqual(drain_outbox(), 'Delivered 0 notifications, 1 to retry, 0 failed, 0 rate limited')
+            entry.refresh_from_db()
+            self.assertEqual(entry.attempts, 1)
+            self.assertGreater(entry.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+            self.assertEqual(drain_outbox(), 'Delivered 0 notifications, 0 to retry, 0 failed, 0 rate limited')
+            Outbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(drain_outbox(), 'Delivered 0 notifications, 0 to retry, 1 failed, 0 rate limited')
+            self.assertEqual(drain_outbox(), 'Delivered 0 notifications, 0 to retry, 0 failed, 0 rate limited')
+
+        entry.refresh_from_db()
+        self.assertIsNotNone(entry.failed_at)
+        self.wish.refresh_from_db()
+        self.assertEqual(self.wish.status, 'sent')
+        self.assertEqual(UserWishStats.objects.for_user(self.sender).sent_count, 1)
+
+    def test_recipient_without_email_is_not_a_failure(self):
+        """Test a notification with nowhere to go is dropped without failing"""
+        self.recipient.email = ''
+        self.recipient.save()
+        self.wish.mark_as_sent()
+
+        self.assertEqual(drain_outbox(), 'Delivered 0 notifications, 0 to retry, 0 failed, 0 rate limited')
+        self.assertFalse(Outbox.objects.exists())
+        self.wish.refresh_from_db()
+        self.assertEqual(self.wish.status, 'sent')
+
+
+EMAIL_LIMITS = {'email': {'total': {'rate': 10, 'burst': 3}, 'domains': {'*': {'rate': 1, 'burst': 2}}}}
+
+
+class RateLimitTest(TestCase):
+    """Test cases for shared token buckets on outbound notifications"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills(self):
+        """Test tokens run out, report the wait for the next one and refill over time"""
+        bucket = TokenBucket('test', rate=2, burst=3)
+        self.assertEqual(bucket.take(5, now=100.0), (3, 0.5))
+        self.assertEqual(bucket.take(1, now=100.25), (0, 0.25))
+        self.assertEqual(bucket.take(2, now=101.0), (2, 0.0))
+        self.assertEqual(bucket.state(now=110.0)['tokens'], 3)
+
+    def test_admit_per_domain_and_total(self):
+        """Test each domain gets its own bucket under the channel total"""
+        addresses = ['a@x.com', 'b@x.com', 'c@x.com', 'd@y.com', 'e@y.com']
+        with self.settings(NOTIFICATION_RATE_LIMITS=EMAIL_LIMITS):
+            allowed, waiting = admit('email', addresses, lambda a: a.split('@')[1], now=100.0)
+
+        self.assertEqual(allowed, ['a@x.com', 'b@x.com', 'd@y.com'])
+        self.assertEqual([a for a, _ in waiting], ['c@x.com', 'e@y.com'])
+        self.assertTrue(all(delay > 0 for _, delay in waiting))
+
+        with self.settings(NOTIFICATION_RATE_LIMITS=EMAIL_LIMITS):
+            self.assertEqual(set(snapshot(now=100.0)), {'email', 'email:x.com', 'email:y.com'})
+            # The y.com token the total refused was given back
+            self.assertEqual(snapshot(now=100.0)['email:y.com']['tokens'], 1)
+
+    def test_per_process_cache_is_rejected(self):
+        """Test the system check refuses rate limits on a cache no two workers share"""
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem, NOTIFICATION_RATE_LIMITS=EMAIL_LIMITS):
+            self.assertEqual([error.id for error in check_rate_limit_cache(None)], ['wishes.E001'])
+            with self.assertRaises(ImproperlyConfigured):
+                admit('email', ['a@x.com'], lambda a: 'x.com')
+        with self.settings(CACHES=locmem, NOTIFICATION_RATE_LIMITS={}):
+            self.assertEqual(check_rate_limit_cache(None), [])
+        self.assertEqual(check_rate_limit_cache(None), [])
+
+    def test_drain_requeues_without_spending_attempts(self):
+        """Test limited outbox entries wait with a delay and keep their attempt budget"""
+        sender = User.objects.create_user(username='limit_sender', password='pass123')
+        for i in range(4):
+            recipient = User.objects.create_user(username=f'limit_{i}', email=f'limit_{i}@example.com')
+            BirthdayWish.objects.create(sender=sender, recipient=recipient, text_content='Hi').mark_as_sent()
+
+        with self.settings(NOTIFICATION_RATE_LIMITS=EMAIL_LIMITS):
+            self.assertEqual(drain_outbox(), 'Delivered 2 notifications, 0 to retry, 0 failed, 2 rate limited')
+
+        self.assertEqual(len(mail.outbox), 2)
+        waiting = Outbox.objects.all()
+        self.assertEqual([entry.attempts for entry in waiting], [0, 0])
+        self.assertTrue(all(entry.next_attempt_at > timezone.now() for entry in waiting))
+
+        response = self.client.get('/health/')
+        self.assertIn('email:example.com', response.json()['rate_limits'])
+
+
+class StatusTransitionTest(TestCase):
+    """Test cases for compare-and-set wish status transitions"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='cas_sender', password='pass123')
+        self.recipient = User.objects.create_user(username='cas_recipient', email='cas@example.com')
+        self.wish = BirthdayWish.objects.create(
+            sender=self.sender, recipient=self.recipient, text_content='Hi', status='scheduled'
+        )
+
+    def test_only_one_caller_wins(self):
+        """Test two workers holding the same wish send it once"""
+        first = BirthdayWish.objects.get(pk=self.wish.pk)
+        second = BirthdayWish.objects.get(pk=self.wish.pk)
+
+        self.assertTrue(first.mark_as_sent(expected='scheduled'))
+        self.assertFalse(second.mark_as_sent(expected='scheduled'))
+        self.assertEqual(second.status, 'sent')
+        self.assertEqual(second.sent_date, first.sent_date)
+
+        self.assertEqual(send_scheduled_wish(self.wish.pk), f"Wish {self.wish.pk} already sent")
+        self.assertEqual(Outbox.objects.count(), 1)
+        stats = UserWishStats.objects.for_user(self.sender)
+        self.assertEqual((stats.sent_count, stats.scheduled_count), (1, 0))
+
+        # Later saves of either copy must not count the transition again
+        second.is_public = True
+        second.save()
+        self.assertEqual(UserWishStats.objects.for_user(self.sender).sent_count, 1)
+
+    def test_transition_is_one_conditional_update(self):
+        """Test the status and sent_date are set by a single UPDATE guarded by the expected status"""
+        with CaptureQueriesContext(connection) as captured:
+            won = BirthdayWish.objects.filter(pk=self.wish.pk).transition(
+                'sent', expected='scheduled', sent_date=timezone.now()
+            )
+        updates = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('UPDATE "wishes_birthdaywish"')]
+        self.assertEqual(won, [self.wish.pk])
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"sent_date"', updates[0])
+        self.assertIn('"status" = ', updates[0].split(' WHERE ', 1)[1])
+
+    def test_bulk_transition_skips_rows_already_moved(self):
+        """Test a bulk transition reports only the rows it moved"""
+        other = BirthdayWish.objects.create(
+            sender=self.sender, recipient=self.recipient, text_content='Hi again', status='sent'
+        )
+        won = BirthdayWish.objects.filter(pk__in=[self.wish.pk, other.pk]).transition('sent', sent_date=timezone.now())
+        self.assertEqual(won, [self.wish.pk])
+        self.assertEqual(BirthdayWish.objects.filter(pk__in=[self.wish.pk, other.pk]).transition('sent'), [])
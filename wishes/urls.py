@@ -14,6 +14,8 @@ urlpatterns = [
 
     # Calendar
     path('calendar/', views.calendar_view, name='calendar'),
+    path('calendar/data/', views.calendar_data, name='calendar_data'),
+    path('calendar/feed/<str:token>.ics', views.ics_feed, name='ics_feed'),
 
     # Gift suggestions
     path('gifts/', views.gift_suggestions, name='gift_suggestions'),
@@ -25,6 +27,7 @@ urlpatterns = [
 
     # Chatbot
     path('api/chatbot/', views.chatbot_api, name='chatbot_api'),
+    path('users/autocomplete/', views.user_autocomplete, name='user_autocomplete'),
 
     # Authentication
     path('register/', views.register, name='register'),
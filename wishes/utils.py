@@ -1,19 +1,21 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from django.utils import timezone
 from datetime import datetime, timedelta
 import random
 import openai
 
+from .birthdays import birthday_facts
 
-def send_birthday_notification(wish):
-    """Send birthday notification to recipient"""
-    subject = f"🎉 Birthday Wish from {wish.sender.get_full_name() or wish.sender.username}"
+
+def build_birthday_notification(wish):
+    """Render the notification email for one wish"""
+    sender_name = wish.sender.get_full_name() or wish.sender.username
+    subject = f"🎉 Birthday Wish from {sender_name}"
 
     message = f"""
     You've received a birthday wish!
 
-    From: {wish.sender.get_full_name() or wish.sender.username}
+    From: {sender_name}
     Message: {wish.text_content}
 
     View your wish at: {settings.SITE_URL}/dashboard/
@@ -21,30 +23,68 @@ def send_birthday_notification(wish):
     Have a wonderful birthday!
     """
 
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [wish.recipient.email],
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [wish.recipient.email])
 
 
-def schedule_birthday_wish(wish):
-    """Schedule a birthday wish using Celery"""
-    from .tasks import send_scheduled_wish
+def send_bulk_mail(messages, batch_size=None, connection=None):
+    """
+    Send (key, EmailMessage) pairs over one reused mail connection.
+
+    The connection is reopened every batch_size messages (EMAIL_BATCH_SIZE by
+    default), since SMTP servers cap messages per session. Returns
+    {key: delivered} so callers can tell which messages failed.
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    connection = connection or get_connection(fail_silently=False)
+    messages = list(messages)
+    results = {}
+
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        try:
+            connection.open()
+        except Exception as e:
+            print(f"Error opening mail connection: {e}")
+            results.update((key, False) for key, _ in batch)
+            continue
+
+        try:
+            for key, message in batch:
+                try:
+                    results[key] = connection.send_messages([message]) == 1
+                except Exception as e:
+                    print(f"Error sending email: {e}")
+                    results[key] = False
+        finally:
+            connection.close()
+
+    return results
+
+
+def send_birthday_notifications(wishes, batch_size=None, connection=None):
+    """Send notifications for many wishes; returns {wish.pk: delivered}"""
+    wishes = list(wishes)
+    results = {wish.pk: False for wish in wishes if not wish.recipient.email}
+    results.update(send_bulk_mail(
+        [(wish.pk, build_birthday_notification(wish)) for wish in wishes if wish.recipient.email],
+        batch_size=batch_size,
+        connection=connection,
+    ))
+    return results
+
 
+def send_birthday_notification(wish):
+    """Send birthday notification to recipient"""
+    return send_birthday_notifications([wish])[wish.pk]
+
+
+def schedule_birthday_wish(wish):
+    """Queue a birthday wish for the due-wish dispatcher"""
     if wish.scheduled_date:
-        # Schedule the task
-        send_scheduled_wish.apply_async(
-            args=[wish.id],
-            eta=wish.scheduled_date
-        )
+        # No per-wish ETA task: dispatch_due_wishes picks it up once due
+        if wish.status != 'scheduled':
+            wish.status = 'scheduled'
+            wish.save()
         return True
     return False
 
@@ -62,7 +102,6 @@ def generate_ai_wish(message, user):
                 "• Group wish coordination"
                 "What would you like to do?",
        'gift': "I'd love to help you find the perfect gift! What's the person's age range and interests?",
-    'template': "We have many birthday wish templates! Would you like something funny, heartfelt, professional, or creative?",
     }
 
     message_lower = message.lower()
@@ -72,6 +111,10 @@ def generate_ai_wish(message, user):
         if keyword in message_lower:
             return response
 
+    # Checked last, where its canned reply used to sit in the keyword table
+    if 'template' in message_lower:
+        return _template_reply(message_lower)
+
     # If OpenAI is configured, use it
     if hasattr(settings, 'OPENAI_API_KEY') and settings.OPENAI_API_KEY:
         try:
@@ -121,39 +164,24 @@ def get_gift_recommendations(age=None, gender=None, interests=None):
 
 def calculate_age(birthday):
     """Calculate age from birthday"""
-    today = timezone.now().date()
-    age = today.year - birthday.year
-
-    if (today.month, today.day) < (birthday.month, birthday.day):
-        age -= 1
-
-    return age
-
-
-def get_birthday_wishes_suggestions(occasion='birthday', category='heartfelt'):
-    """Get wish suggestions based on occasion and category"""
-
-    suggestions = {
-        'heartfelt': [
-            "Wishing you a day filled with love, laughter, and all the happiness your heart can hold. Happy Birthday!",
-            "May this special day bring you endless joy and tons of precious memories. Have a wonderful birthday!",
-            "Here's to another year of wonderful memories and countless blessings. Happy Birthday!",
-        ],
-        'funny': [
-            "Congratulations on being born a really long time ago! 🎉",
-            "You're not getting older, you're just becoming a classic! Happy Birthday! 🎂",
-            "Age is just a number... and in your case, a really big one! 😄 Happy Birthday!",
-        ],
-        'professional': [
-            "Wishing you continued success and happiness on your special day. Happy Birthday!",
-            "May this year bring you professional growth and personal fulfillment. Best wishes on your birthday!",
-            "Happy Birthday! May your day be filled with joy and your year with prosperity.",
-        ],
-        'creative': [
-            "Another 365 days of awesomeness completed! 🌟 Level up! Happy Birthday!",
-            "Today is the anniversary of your legendary arrival on Earth! 🚀 Happy Birthday!",
-            "The world became a better place the day you were born. Keep shining! ✨ Happy Birthday!",
-        ]
-    }
+    return birthday_facts([birthday])[0].age
+
+
+def get_birthday_wishes_suggestions(occasion='birthday', category='heartfelt', limit=3, weighted=True):
+    """Get wish suggestions based on occasion and category, weighted by template usage"""
+    from .suggestions import get_suggestion_engine
+
+    return get_suggestion_engine().suggest(occasion, category, limit=limit, weighted=weighted)
+
+
+def _template_reply(message_lower):
+    """Chatbot reply for the template intent, with a suggestion in the requested style"""
+    from .suggestions import DEFAULT_SUGGESTIONS
+
+    category = next((name for name in DEFAULT_SUGGESTIONS if name in message_lower), None)
+    suggestions = get_birthday_wishes_suggestions(category=category, limit=1)
+    if not suggestions:
+        return "We have many birthday wish templates! Would you like something funny, heartfelt, professional, or creative?"
 
-    return suggestions.get(category, suggestions['heartfelt'])
\ No newline at end of file
+    style = f"{category} " if category else ""
+    return f'Here\'s a popular {style}one: "{suggestions[0]}" Want something funny, heartfelt, professional, or creative instead?'
@@ -1,29 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import SimpleLazyObject
 from django.db.models import Q, Count
 from django.core.paginator import Paginator
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 from django.views.decorators.csrf import csrf_protect
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 from .models import (
     UserProfile, BirthdayWish, GroupWish, GroupWishContribution,
-    GiftSuggestion, CalendarEvent, ChatMessage, WishTemplate
+    GiftSuggestion, CalendarEvent, ChatMessage, UpcomingBirthday,
+    UserSearchTerm, UserWishStats
 )
+from .birthdays import birthday_facts, ordinal_ranges
+from .fragments import FRAGMENT_TIMEOUT, get_fragment_versions
+from .ics import cached_feed, feed_token, get_feed_version, user_id_for_token
+from .site_stats import total_wishes_sent
+from .template_catalog import get_template_catalog, record_usage
 from .forms import (
     UserProfileForm, BirthdayWishForm, GroupWishForm,
     VoiceMessageForm, CalendarEventForm
 )
 from .utils import (
-    send_birthday_notification, generate_ai_wish,
-    schedule_birthday_wish, get_gift_recommendations
+    generate_ai_wish, schedule_birthday_wish, get_gift_recommendations
 )
 
 
@@ -31,13 +39,13 @@ def index(request):
     """Homepage with featured content"""
     context = {
         'upcoming_birthdays': [],
-        'featured_templates': WishTemplate.objects.filter(is_premium=False)[:6],
-        'total_wishes_sent': BirthdayWish.objects.filter(status='sent').count(),
+        'featured_templates': get_template_catalog().featured(6),
+        'total_wishes_sent': total_wishes_sent(),
     }
 
     if request.user.is_authenticated:
         # Get upcoming birthdays for authenticated users
-        context['upcoming_birthdays'] = UserProfile.objects.get_upcoming_birthdays(days=30)
+        context['upcoming_birthdays'] = UserProfile.objects.get_upcoming_birthdays_for(request.user, days=30)
         context['user_wishes'] = BirthdayWish.objects.filter(
             recipient=request.user
         ).order_by('-created_at')[:5]
@@ -45,38 +53,63 @@ def index(request):
     return render(request, 'index.html', context)
 
 
+def _dashboard_summary(user):
+    """Profile, wish counters and active group count in a single query"""
+    profile = UserProfile.objects.select_related('user__wish_stats').annotate(
+        active_group_count=Count(
+            'user__contributed_wishes',
+            filter=Q(user__contributed_wishes__is_active=True),
+            distinct=True,
+        )
+    ).filter(user=user).first()
+
+    if profile is None:
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        profile.active_group_count = 0
+
+    try:
+        stats = profile.user.wish_stats
+    except UserWishStats.DoesNotExist:
+        stats = UserWishStats(user=user)
+
+    return {
+        'profile': profile,
+        'sent_wishes': stats.sent_count,
+        'received_wishes': stats.received_count,
+        'scheduled_wishes': stats.scheduled_count,
+        'active_group_count': profile.active_group_count,
+    }
+
+
 @login_required
 def dashboard(request):
     """User dashboard with statistics and overview"""
-    user_profile, created = UserProfile.objects.get_or_create(user=request.user)
-
-    # Statistics
-    sent_wishes = BirthdayWish.objects.filter(sender=request.user, status='sent').count()
-    received_wishes = BirthdayWish.objects.filter(recipient=request.user, status='sent').count()
-    scheduled_wishes = BirthdayWish.objects.filter(sender=request.user, status='scheduled').count()
+    # Panels are cached as fragments, so nothing below is queried unless one misses
+    summary = SimpleLazyObject(lambda: _dashboard_summary(request.user))
 
-    # Upcoming birthdays
-    upcoming = UserProfile.objects.get_upcoming_birthdays(days=30)
+    # Upcoming birthdays of the user's contacts
+    upcoming = UpcomingBirthday.objects.within_for(request.user, days=30)
 
     # Recent activity
     recent_wishes = BirthdayWish.objects.filter(
         Q(sender=request.user) | Q(recipient=request.user)
-    ).order_by('-created_at')[:10]
+    ).select_related('sender', 'recipient').order_by('-created_at')[:10]
 
     # Group wishes
     active_group_wishes = GroupWish.objects.filter(
         contributors=request.user,
         is_active=True
-    ).distinct()
+    ).distinct().prefetch_related('contributors')[:3]
 
     context = {
-        'user_profile': user_profile,
-        'sent_wishes': sent_wishes,
-        'received_wishes': received_wishes,
-        'scheduled_wishes': scheduled_wishes,
+        'user_profile': SimpleLazyObject(lambda: summary['profile']),
+        'summary': summary,
         'upcoming_birthdays': upcoming,
         'recent_wishes': recent_wishes,
         'active_group_wishes': active_group_wishes,
+        'fragment_versions': get_fragment_versions(request.user.pk),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
+        'today': timezone.now().date(),
     }
 
     return render(request, 'dashboard.html', context)
@@ -91,21 +124,22 @@ def create_wish(request):
         if form.is_valid():
             wish = form.save(commit=False)
             wish.sender = request.user
-            wish.save()
 
             # Handle voice message if uploaded
             if 'voice_message' in request.FILES:
                 wish.voice_message = request.FILES['voice_message']
                 wish.wish_type = 'voice'
-                wish.save()
+
+            wish.save()
+            record_usage(request.POST.get('template_id'))
 
             # Schedule if needed
             if wish.scheduled_date:
                 schedule_birthday_wish(wish)
                 messages.success(request, 'Birthday wish scheduled successfully!')
             else:
+                # Queues the notification in the outbox; workers deliver it
                 wish.mark_as_sent()
-                send_birthday_notification(wish)
                 messages.success(request, 'Birthday wish sent successfully!')
 
             return redirect('dashboard')
@@ -113,7 +147,7 @@ def create_wish(request):
         form = BirthdayWishForm()
 
     # Get available templates
-    templates = WishTemplate.objects.all()[:10]
+    templates = get_template_catalog().templates[:10]
 
     context = {
         'form': form,
@@ -125,33 +159,97 @@ def create_wish(request):
 
 @login_required
 def calendar_view(request):
-    """Calendar view with all birthdays"""
-    # Get all user profiles with birthdays
-    profiles = UserProfile.objects.exclude(birthday__isnull=True)
-
+    """Calendar view; birthdays are fetched per visible range from calendar_data"""
     # Get user's calendar events
     events = CalendarEvent.objects.filter(user=request.user)
 
-    # Prepare calendar data
-    calendar_data = []
-    for profile in profiles:
-        next_birthday = profile.get_next_birthday()
-        if next_birthday:
-            calendar_data.append({
-                'title': f"{profile.user.get_full_name() or profile.user.username}'s Birthday",
-                'date': next_birthday.isoformat(),
-                'user_id': profile.user.id,
-                'age': profile.get_age(),
-            })
-
     context = {
-        'calendar_data': json.dumps(calendar_data),
         'events': events,
     }
 
     return render(request, 'calendar.html', context)
 
 
+@login_required
+def calendar_data(request):
+    """Stream the birthdays inside the requested [start, end) window as JSON"""
+    try:
+        start = parse_date(request.GET.get('start', '')[:10])
+        end = parse_date(request.GET.get('end', '')[:10])
+    except ValueError:
+        # Well formed but impossible, e.g. 2025-02-30
+        start = end = None
+
+    if not start or not end or end <= start or (end - start).days > 366:
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid date range'
+        }, status=400)
+
+    return StreamingHttpResponse(
+        _stream_calendar_birthdays(start, end - timedelta(days=1)),
+        content_type='application/json'
+    )
+
+
+def _stream_calendar_birthdays(start, end):
+    """Yield a JSON array of birthday events between start and end (inclusive)"""
+    yield '['
+    separator = ''
+
+    for year in range(start.year, end.year + 1):
+        first = max(start, start.replace(year=year, month=1, day=1))
+        last = min(end, end.replace(year=year, month=12, day=31))
+        low, high = ordinal_ranges(first, (last - first).days)[0]
+
+        profiles = UserProfile.objects.filter(
+            birthday_ordinal__range=(low, high)
+        ).select_related('user').order_by('birthday_ordinal')
+
+        for profile in profiles.iterator(chunk_size=500):
+            occurrence = birthday_facts([profile.birthday], first)[0].next_birthday
+            yield separator + json.dumps({
+                'title': f"{profile.user.get_full_name() or profile.user.username}'s Birthday",
+                'date': occurrence.isoformat(),
+                'user_id': profile.user_id,
+                'age': occurrence.year - profile.birthday.year,
+            })
+            separator = ','
+
+    yield ']'
+
+
+def _ics_etag(request, token):
+    user_id = user_id_for_token(token)
+    if user_id is None:
+        return None
+    version, _ = get_feed_version(user_id)
+    return f'{user_id}-{version}'
+
+
+def _ics_last_modified(request, token):
+    user_id = user_id_for_token(token)
+    if user_id is None:
+        return None
+    _, last_modified = get_feed_version(user_id)
+    return datetime.fromtimestamp(last_modified, tz=dt_timezone.utc)
+
+
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=_ics_etag, last_modified_func=_ics_last_modified)
+def ics_feed(request, token):
+    """Tokenized ICS feed of contacts' birthdays and the user's calendar events"""
+    user_id = user_id_for_token(token)
+    if user_id is None:
+        raise Http404('Unknown calendar feed')
+
+    feed = cached_feed(user_id)
+    content_type = 'text/calendar; charset=utf-8'
+    if isinstance(feed, str):
+        return HttpResponse(feed, content_type=content_type)
+    return StreamingHttpResponse(feed, content_type=content_type)
+
+
 @login_required
 def gift_suggestions(request):
     """Gift suggestions page with filtering"""
@@ -327,6 +425,19 @@ def chatbot_api(request):
     }, status=405)
 
 
+@login_required
+def user_autocomplete(request):
+    """Users whose username or name starts with the query, for recipient pickers"""
+    users = UserSearchTerm.objects.search(request.GET.get('q', ''), limit=10, exclude_user=request.user)
+
+    return JsonResponse({
+        'results': [
+            {'id': user.pk, 'username': user.username, 'name': user.get_full_name()}
+            for user in users
+        ]
+    })
+
+
 @login_required
 def profile_view(request):
     """User profile page"""
@@ -345,6 +456,9 @@ def profile_view(request):
     context = {
         'form': form,
         'profile': profile,
+        'ics_feed_url': request.build_absolute_uri(
+            reverse('ics_feed', args=[feed_token(request.user)])
+        ),
     }
 
     return render(request, 'profile.html', context)